@@ -1,44 +1,231 @@
 # app.py
 # --- Importaciones ---
 # Módulos estándar y de Flask
+import time
+_INICIO_PROCESO = time.perf_counter()  # Referencia para medir importación, precalentamiento y primera respuesta.
+import os
+from dotenv import load_dotenv
+load_dotenv()  # Carga las variables de entorno desde el archivo .env
+
+# Polars fija el tamaño de su pool de hilos (global al proceso) la primera vez que se importa, así que
+# se limita aquí, antes de cualquier `import polars`. El límite es para todo el proceso (también las
+# consultas de las peticiones interactivas usan ese pool): lo que deja libre es un núcleo para el
+# trabajo fuera de Polars (Python, serialización a JSON, el propio servidor) mientras corren las
+# exportaciones. POLARS_MAX_THREADS en el .env tiene prioridad.
+from config import settings
+os.environ.setdefault(
+    'POLARS_MAX_THREADS',
+    str(max(1, (os.cpu_count() or 1) - settings.NUCLEOS_RESERVADOS_INTERACTIVOS))
+)
+
 import traceback
+import threading
 import datetime
 import io
-import time
+import json
+import tempfile
 from functools import wraps
+import click
+from urllib.parse import urlencode
 import polars as pl
-from flask import Flask, jsonify, send_file, request
+from flask import Flask, jsonify, send_file, request, Response, stream_with_context, copy_current_request_context
 from flask_cors import CORS, cross_origin
-from dotenv import load_dotenv
 from flask_caching import Cache
-from extensions import cache
+from extensions import cache, cache_datos
 
 # Módulos específicos de la aplicación
-from config import settings
 from db.mySQL_connector import obtener_rango_fechas
+from db.indices import asegurar_indices, revisar_planes_consultas
 from logic.data_processor import (
     buscar_facturas_completas,
-    generar_y_comprobar_todas_las_tablas,
+    buscar_facturas_completas_por_lotes,
+    buscar_facturas_parcial,
+    calcular_kpis_dashboard,
+    obtener_tablas_exportacion,
     generar_excel_en_memoria,
     generar_excel_busqueda_en_memoria,
     obtener_resumenes_paginados,
-    obtener_detalle_especifico_factura
+    obtener_pagina_resumenes,
+    obtener_snapshot_rango,
+    obtener_ingresos_por_periodo,
+    GRANULARIDADES_INGRESOS,
+    obtener_detalle_especifico_factura,
+    buscar_facturas_completas_tabla,
+    obtener_kpis_version_actual,
+    revalidar_snapshot,
+    precalentar_snapshot,
+    NOMBRES_HOJAS_EXCEL,
+    NOMBRE_HOJA_BUSQUEDA
+)
+from logic.control_carga import repartir_hilos_worker, crear_limitadores, crear_limitador_global, crear_ejecutor_pesado
+from logic.trabajos_exportacion import GestorExportaciones, ExportacionSinDatos
+from logic.notificador_kpis import NotificadorKpis
+from logic.formatos_respuesta import (
+    MIMETYPE_JSON,
+    MIMETYPE_NDJSON,
+    MIMETYPE_ARROW_STREAM,
+    MIMETYPE_PARQUET,
+    FORMATOS_BINARIOS,
+    generar_ndjson,
+    generar_arrow_ipc,
+    serializar_dataframe
 )
 
+print(f"Módulos de la aplicación importados en {(time.perf_counter() - _INICIO_PROCESO) * 1000:.2f} ms")
+
+# --- Precalentamiento opcional (ver sección 3) ---
+PRECALENTAMIENTO_ACTIVO = os.getenv('PRECALENTAR_AL_INICIO') == '1'
+# Se marca al terminar el precalentamiento (o de inmediato si no hay): gunicorn.conf.py no deja que
+# el worker acepte peticiones hasta entonces, y /estado-carga lo informa.
+precalentamiento_listo = threading.Event()
+if not PRECALENTAMIENTO_ACTIVO:
+    precalentamiento_listo.set()
+
 # --- Decorador para Medir Tiempo de Ejecución ---
+_primera_respuesta_registrada = False
+
 def log_execution_time(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        global _primera_respuesta_registrada
+        # Con precalentamiento, lo que interesa es la primera respuesta con los datos ya cargados:
+        # una que empezó antes de terminar el precalentamiento no cuenta.
+        datos_listos = precalentamiento_listo.is_set()
         start_time = time.perf_counter()
         result = func(*args, **kwargs)
         end_time = time.perf_counter()
         execution_time_ms = (end_time - start_time) * 1000
         print(f"Endpoint '{func.__name__}' ejecutado en {execution_time_ms:.2f} ms")
+        if not _primera_respuesta_registrada and datos_listos:
+            _primera_respuesta_registrada = True
+            if PRECALENTAMIENTO_ACTIVO:
+                print(f"Primera respuesta rápida (datos precalentados) a los {(end_time - _INICIO_PROCESO) * 1000:.2f} ms del arranque")
+            else:
+                print(f"Primera respuesta del proceso a los {(end_time - _INICIO_PROCESO) * 1000:.2f} ms del arranque")
         return result
     return wrapper
 
+# --- Negociación de Contenido para los Endpoints de Datos ---
+def _formato_datos_solicitado(*formatos_extra) -> str:
+    """
+    Devuelve el tipo MIME preferido por el cliente según su cabecera `Accept`.
+    JSON va primero en la lista, así que un navegador (`*/*`) siempre recibe JSON.
+    """
+    return request.accept_mimetypes.best_match(
+        [MIMETYPE_JSON, *formatos_extra, *FORMATOS_BINARIOS], default=MIMETYPE_JSON
+    )
+
+def _clave_cache_con_formato(*args, **kwargs) -> str:
+    """
+    Clave de caché basada en la query string Y en el formato negociado, para que una
+    respuesta Parquet cacheada nunca se sirva a quien pidió JSON (y viceversa).
+    """
+    query_ordenada = urlencode(sorted(request.args.items(multi=True)))
+    return f"view/{request.path}?{query_ordenada}|{_formato_datos_solicitado()}"
+
+def _respuesta_binaria(df: pl.DataFrame, formato: str, nombre_base: str, metadatos: dict = None) -> Response:
+    """Construye la respuesta HTTP con un DataFrame serializado en Arrow IPC o Parquet."""
+    contenido = serializar_dataframe(df, formato, metadatos)
+    nombre_archivo = f"{nombre_base}.{FORMATOS_BINARIOS[formato]}"
+    return Response(
+        contenido,
+        mimetype=formato,
+        headers={'Content-Disposition': f'attachment; filename="{nombre_archivo}"'}
+    )
+
+# --- Control de Admisión para los Endpoints Pesados ---
+# Cada endpoint pesado tiene su límite de ejecuciones simultáneas y su cola (ver settings.py);
+# el trabajo admitido corre en un pool de hilos propio, pero el hilo que atiende la petición sigue
+# ocupado esperándolo. Por eso los hilos reales del worker (GUNICORN_THREADS, el mismo valor que usa
+# gunicorn.conf.py) se reparten al arrancar: un tope global de peticiones pesadas que, descontando
+# las suscripciones SSE, deja siempre hilos libres para el resto de endpoints.
+reparto_hilos = repartir_hilos_worker(
+    settings.HILOS_POR_WORKER, settings.KPI_SSE_MAX_CONEXIONES, settings.HILOS_RESERVADOS_INTERACTIVOS
+)
+print(
+    f"Hilos por worker: {reparto_hilos['hilos']} ({reparto_hilos['max_conexiones_sse']} para SSE, "
+    f"{reparto_hilos['max_peticiones_pesadas']} para peticiones pesadas, "
+    f"{reparto_hilos['reservados_interactivos']} reservados para las interactivas)"
+)
+limitadores_pesados = crear_limitadores(
+    settings.LIMITES_ENDPOINTS_PESADOS, settings.ADMISION_ESPERA_MAX_SEGUNDOS, settings.TRABAJOS_PESADOS_HILOS
+)
+limitador_pesados_global = crear_limitador_global(reparto_hilos['max_peticiones_pesadas'])
+ejecutor_pesado = crear_ejecutor_pesado(settings.TRABAJOS_PESADOS_HILOS)
+
+def admision_controlada(nombre_limite: str):
+    """
+    Decorador para endpoints pesados. Si el endpoint está saturado responde 503 con `Retry-After`;
+    si no, ejecuta la vista en `ejecutor_pesado`. Debe ir DEBAJO de `@cache.cached` para que los
+    aciertos de caché se sirvan sin pasar por la cola.
+    """
+    limitador = limitadores_pesados[nombre_limite]
+
+    def decorator(func):
+        def rechazar():
+            segundos = limitador.segundos_reintento()
+            print(f"Endpoint '{func.__name__}' saturado: petición rechazada (reintentar en {segundos} s)")
+            respuesta = jsonify({
+                'success': False,
+                'message': 'El servidor está procesando demasiadas solicitudes de este tipo. Intente de nuevo en unos segundos.',
+                'reintentar_en_segundos': segundos
+            })
+            return respuesta, 503, {'Retry-After': str(segundos)}
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Primero el tope global (sin espera): una petición que no cabe no llega a ocupar un hilo en cola.
+            if not limitador_pesados_global.entrar():
+                return rechazar()
+
+            inicio_global = time.perf_counter()
+            try:
+                if not limitador.entrar():
+                    return rechazar()
+
+                inicio = time.perf_counter()
+                try:
+                    # La vista necesita `request`, así que se lleva una copia del contexto al hilo del pool.
+                    return ejecutor_pesado.submit(copy_current_request_context(func), *args, **kwargs).result()
+                finally:
+                    limitador.salir(time.perf_counter() - inicio)
+            finally:
+                limitador_pesados_global.salir(time.perf_counter() - inicio_global)
+        return wrapper
+    return decorator
+
+def _respuesta_cacheable(respuesta) -> bool:
+    """Evita que `@cache.cached` guarde un rechazo por saturación (503)."""
+    codigo = respuesta[1] if isinstance(respuesta, tuple) and len(respuesta) > 1 else getattr(respuesta, 'status_code', 200)
+    return codigo != 503
+
+# --- Exportaciones en Segundo Plano ---
+# Los estados y archivos se guardan en EXPORTACION_DIR (por defecto, una carpeta del directorio
+# temporal) para que todos los workers de gunicorn vean los mismos trabajos.
+gestor_exportaciones = GestorExportaciones(
+    directorio=os.getenv('EXPORTACION_DIR', os.path.join(tempfile.gettempdir(), 'dashboard_gema_exportaciones')),
+    hilos=settings.EXPORTACION_HILOS,
+    retencion_s=settings.EXPORTACION_RETENCION_SEGUNDOS,
+    tiempo_max_s=settings.EXPORTACION_TIEMPO_MAX_SEGUNDOS
+)
+
+# --- Notificación de KPIs (Server-Sent Events) ---
+# Un hilo por proceso revisa si los datos se recargaron y envía los KPIs nuevos a los navegadores suscritos.
+notificador_kpis = NotificadorKpis(
+    obtener_kpis=obtener_kpis_version_actual,
+    intervalo_s=settings.KPI_PUSH_INTERVALO_SEGUNDOS,
+    max_conexiones=reparto_hilos['max_conexiones_sse'],
+    revalidar=revalidar_snapshot
+)
+# Espera (ms) que el navegador deja pasar antes de reconectarse cuando se cierra el flujo.
+SSE_RECONEXION_MS = 5000
+
+def _nombre_excel_rango(fecha_inicio: str, fecha_fin: str) -> str:
+    """Nombre del archivo Excel del reporte por rango de fechas."""
+    nombre_periodo = f"{fecha_inicio}_a_{fecha_fin}" if fecha_inicio and fecha_fin else datetime.date.today().isoformat()
+    return f"{settings.EXCEL_OUTPUT_FILENAME_BASE}_{nombre_periodo}.xlsx"
+
 # --- Configuración Inicial de la Aplicación ---
-load_dotenv()  # Carga las variables de entorno desde el archivo .env
 app = Flask(__name__)  # Inicializa la aplicación Flask
 
 # Configura CORS (Cross-Origin Resource Sharing) para permitir que el frontend
@@ -55,6 +242,85 @@ cache.init_app(app, config={
     'CACHE_DEFAULT_TIMEOUT': 300  # Tiempo por defecto en segundos (5 minutos)
 })
 
+# La caché de DataFrames (snapshot, índices, vistas por rango) se limita por memoria, no por número
+# de entradas. CACHE_DATOS_MAX_MB fija el presupuesto por proceso (cada worker tiene el suyo).
+cache_datos.init_app(app, config={
+    'CACHE_DATOS_MAX_BYTES': int(os.getenv('CACHE_DATOS_MAX_MB', '512')) * 1024 * 1024,
+    'CACHE_DATOS_DEFAULT_TIMEOUT': 600
+})
+
+# --- 3. Precalentamiento opcional ---
+# Con PRECALENTAR_AL_INICIO=1 el snapshot completo y sus índices se cargan en un hilo nada más
+# importar la app. No se hace de forma síncrona: con gunicorn la importación ocurre antes de que el
+# worker empiece a avisar al maestro de que sigue vivo, y una carga más larga que `timeout` haría
+# que lo matara y lo reiniciara en bucle. En su lugar, el hook `post_worker_init` de
+# gunicorn.conf.py espera a `precalentamiento_listo` sin dejar de avisar al maestro, y el worker
+# no acepta peticiones hasta entonces. Con el servidor de desarrollo no hay esa espera: las
+# peticiones que lleguen antes esperan a la misma carga (la caché no calcula dos veces la misma clave).
+# Con gunicorn esto ocurre dentro de cada worker: precalentar en el proceso maestro y luego hacer
+# fork deja a Polars sin su pool de hilos.
+def _es_vigilante_del_recargador() -> bool:
+    """En modo debug, Flask ejecuta este archivo en un proceso vigilante que no sirve peticiones."""
+    return __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+def _precalentar_en_segundo_plano():
+    try:
+        with app.app_context():
+            tiempos = precalentar_snapshot()
+        print(
+            f"Precalentamiento completado: {tiempos['filas']} filas, snapshot en {tiempos['snapshot_ms']:.2f} ms, "
+            f"índice en {tiempos['indice_facturas_ms']:.2f} ms, series de ingresos en {tiempos['series_ingresos_ms']:.2f} ms. "
+            f"Listo a los {(time.perf_counter() - _INICIO_PROCESO) * 1000:.2f} ms del arranque"
+        )
+    except Exception:
+        # Un fallo aquí (ej. BD caída) no debe impedir servir: la primera petición cargará los datos.
+        traceback.print_exc()
+    finally:
+        precalentamiento_listo.set()
+
+if PRECALENTAMIENTO_ACTIVO and not _es_vigilante_del_recargador():
+    threading.Thread(target=_precalentar_en_segundo_plano, name="precalentamiento", daemon=True).start()
+
+# --- 4. Revisión opcional de índices ---
+# Con REVISAR_INDICES_AL_INICIO=1 se ejecuta EXPLAIN sobre las consultas de la app y se avisa en
+# consola si alguna va a recorrer tablas completas. Solo avisa: nunca impide arrancar.
+if os.getenv('REVISAR_INDICES_AL_INICIO') == '1' and not _es_vigilante_del_recargador():
+    advertencias, error = revisar_planes_consultas()
+    if error:
+        print(f"No se pudieron revisar los índices: {error}")
+    for advertencia in advertencias or []:
+        print(f"ADVERTENCIA DE ÍNDICES: {advertencia}")
+
+# ==============================================================================
+# SECCIÓN: COMANDOS DE CONSOLA (flask --app app <comando>)
+# ==============================================================================
+
+@app.cli.command('crear-indices')
+@click.option('--solo-mostrar', is_flag=True, help='Muestra las sentencias sin ejecutarlas.')
+def crear_indices_comando(solo_mostrar):
+    """Crea en la BD los índices que necesitan las consultas de la aplicación."""
+    acciones, error = asegurar_indices(solo_mostrar=solo_mostrar)
+    if error:
+        raise click.ClickException(error)
+    for accion in acciones:
+        click.echo(f"[{accion['estado']}] {accion['tabla']}.{accion['indice']}")
+        if accion['estado'] == 'pendiente':
+            click.echo(f"    {accion['sql']};")
+    if any(accion['estado'].startswith('error') for accion in acciones):
+        raise click.ClickException("No se pudieron crear todos los índices.")
+
+@app.cli.command('revisar-indices')
+def revisar_indices_comando():
+    """Ejecuta EXPLAIN sobre las consultas y falla si alguna recorre tablas completas."""
+    advertencias, error = revisar_planes_consultas()
+    if error:
+        raise click.ClickException(error)
+    for advertencia in advertencias:
+        click.echo(f"ADVERTENCIA: {advertencia}")
+    if advertencias:
+        raise click.ClickException(f"{len(advertencias)} consulta(s) sin índice adecuado.")
+    click.echo("Todas las consultas usan índices.")
+
 # ==============================================================================
 # SECCIÓN: ENDPOINTS DE LA API
 # ==============================================================================
@@ -95,7 +361,8 @@ def get_rango_fechas():
 # timeout=300: Cachea por 5 minutos.
 # query_string=True: CRÍTICO. Crea una clave de caché diferente para cada combinación
 # de fecha_inicio y fecha_fin. Así, el análisis de Enero no se confunde con el de Febrero.
-@cache.cached(timeout=300, query_string=True)
+@cache.cached(timeout=300, query_string=True, response_filter=_respuesta_cacheable)
+@admision_controlada('analizar_y_comprobar')
 def analizar_y_comprobar():
     """
     Endpoint principal para el dashboard.
@@ -106,9 +373,13 @@ def analizar_y_comprobar():
         # Extrae los parámetros de filtro de la URL (ej. ?fecha_inicio=2024-01-01)
         fecha_inicio = request.args.get('fecha_inicio')
         fecha_fin = request.args.get('fecha_fin')
+        granularidad = request.args.get('granularidad')
+
+        if granularidad and granularidad not in GRANULARIDADES_INGRESOS:
+            return jsonify({'success': False, 'message': f"Granularidad no válida. Use: {', '.join(GRANULARIDADES_INGRESOS)}."}), 400
         
         # Llama a la función orquestadora principal de la capa de lógica.
-        _, comprobacion = generar_y_comprobar_todas_las_tablas(fecha_inicio, fecha_fin)
+        comprobacion = calcular_kpis_dashboard(fecha_inicio, fecha_fin, granularidad)
         
         # Enriquece la respuesta con una marca de tiempo para que el usuario sepa cuándo se generó.
         comprobacion["timestamp_analisis"] = datetime.datetime.now().isoformat()
@@ -123,10 +394,37 @@ def analizar_y_comprobar():
         return jsonify({'success': False, 'message': 'Ocurrió un error durante el análisis.', 'error': str(e)}), 500
 
 
-@app.route('/api/reportes/descargar-excel', methods=['GET'])
+@app.route('/api/reportes/ingresos', methods=['GET'])
 @cross_origin()
 @log_execution_time
 @cache.cached(timeout=300, query_string=True)
+def get_ingresos_por_periodo():
+    """
+    Endpoint ligero para el gráfico de ingreso de glosas.
+    Permite cambiar de rango o de granularidad (`diario`, `mensual`, `anual`) sin
+    volver a ejecutar el análisis completo: la serie sale de datos precalculados.
+    """
+    try:
+        fecha_inicio = request.args.get('fecha_inicio')
+        fecha_fin = request.args.get('fecha_fin')
+        granularidad = request.args.get('granularidad')
+
+        if granularidad and granularidad not in GRANULARIDADES_INGRESOS:
+            return jsonify({'success': False, 'message': f"Granularidad no válida. Use: {', '.join(GRANULARIDADES_INGRESOS)}."}), 400
+
+        serie = obtener_ingresos_por_periodo(fecha_inicio, fecha_fin, granularidad)
+        return jsonify({'success': True, 'data': serie}), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': 'Error al obtener la serie de ingresos.', 'error': str(e)}), 500
+
+
+@app.route('/api/reportes/descargar-excel', methods=['GET'])
+@cross_origin()
+@log_execution_time
+@cache.cached(timeout=300, query_string=True, response_filter=_respuesta_cacheable)
+@admision_controlada('descargar_excel')
 def descargar_excel():
     """
     Endpoint para la descarga del reporte.
@@ -139,18 +437,17 @@ def descargar_excel():
         
         # Vuelve a ejecutar la lógica principal. Esto asegura que el Excel refleje
         # exactamente los mismos filtros que el dashboard (diseño sin estado).
-        dataframes, _ = generar_y_comprobar_todas_las_tablas(fecha_inicio, fecha_fin)
+        tablas = obtener_tablas_exportacion(fecha_inicio, fecha_fin)
         
-        # Comprueba si el análisis devolvió algún dato para evitar generar un Excel vacío.
-        if not dataframes or all(df.is_empty() for df in dataframes.values()):
+        # Comprueba si el rango tiene algún dato para evitar generar un Excel vacío.
+        if tablas is None:
             return jsonify({'success': False, 'message': 'No se encontraron datos para generar el Excel con los filtros aplicados.'}), 404
         
         # Construye un nombre de archivo dinámico y descriptivo.
-        nombre_periodo = f"{fecha_inicio}_a_{fecha_fin}" if fecha_inicio and fecha_fin else datetime.date.today().isoformat()
-        nombre_archivo = f"{settings.EXCEL_OUTPUT_FILENAME_BASE}_{nombre_periodo}.xlsx"
+        nombre_archivo = _nombre_excel_rango(fecha_inicio, fecha_fin)
         
         print(f"Generando archivo Excel en memoria: {nombre_archivo}")
-        buffer = generar_excel_en_memoria(dataframes)
+        buffer = generar_excel_en_memoria(tablas)
         
         # Crea una copia del buffer en memoria para enviar.
         buffer_to_send = io.BytesIO(buffer.getvalue())
@@ -171,8 +468,13 @@ def descargar_excel():
 @app.route('/api/reportes/resumenes-paginados', methods=['GET'])
 @cross_origin()
 @log_execution_time
-@cache.cached(timeout=300, query_string=True)
+@cache.cached(timeout=300, make_cache_key=_clave_cache_con_formato)
 def get_resumenes_paginados():
+    """
+    Devuelve una página de resúmenes de factura.
+    Con `Accept: application/vnd.apache.arrow.stream` o `application/x-parquet` la página se
+    envía en formato columnar y los datos de paginación viajan en los metadatos del esquema.
+    """
     try:
         fecha_inicio = request.args.get('fecha_inicio')
         fecha_fin = request.args.get('fecha_fin')
@@ -186,6 +488,18 @@ def get_resumenes_paginados():
 
         lista_categorias = categorias_str.split(',')
 
+        formato = _formato_datos_solicitado()
+        if formato in FORMATOS_BINARIOS:
+            df_pagina, metadatos = obtener_pagina_resumenes(
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                categorias=lista_categorias,
+                pagina=pagina,
+                por_pagina=por_pagina,
+                entidad=entidad
+            )
+            return _respuesta_binaria(df_pagina, formato, f"Resumenes_{fecha_inicio}_a_{fecha_fin}_p{pagina}", metadatos)
+
         # --- CORRECCIÓN CLAVE AQUÍ ---
         # Usar argumentos con nombre para evitar errores de posición
         resultado_paginado = obtener_resumenes_paginados(
@@ -249,6 +563,11 @@ def buscar_facturas_por_id():
     Endpoint para buscar facturas por una lista de formatos de factura completos.
     Acepta un JSON con una lista de IDs de factura (ej: FCR123456) y devuelve los datos
     encontrados y no encontrados.
+
+    Según la cabecera `Accept`, la respuesta puede enviarse en streaming para listas muy grandes:
+    - `application/x-ndjson`: una línea JSON por lote y una línea final con el resumen.
+    - `application/vnd.apache.arrow.stream`: record batches Arrow con el resumen como metadata final.
+    Con `application/x-parquet` se devuelve un único archivo Parquet con el resumen en los metadatos.
     """
     try:
         data = request.get_json()
@@ -259,6 +578,22 @@ def buscar_facturas_por_id():
         if not isinstance(lista_ids_factura, list):
              return jsonify({'success': False, 'message': 'Los identificadores deben ser una lista.'}), 400
 
+        # --- Modo streaming: la memoria queda acotada al tamaño de un lote ---
+        formato = _formato_datos_solicitado(MIMETYPE_NDJSON)
+        if formato == MIMETYPE_NDJSON:
+            eventos = buscar_facturas_completas_por_lotes(lista_ids_factura)
+            return Response(stream_with_context(generar_ndjson(eventos)), mimetype=MIMETYPE_NDJSON)
+        if formato == MIMETYPE_ARROW_STREAM:
+            eventos = buscar_facturas_completas_por_lotes(lista_ids_factura)
+            return Response(stream_with_context(generar_arrow_ipc(eventos)), mimetype=MIMETYPE_ARROW_STREAM)
+        if formato == MIMETYPE_PARQUET:
+            resultados = buscar_facturas_completas_tabla(lista_ids_factura)
+            metadatos = {
+                'no_encontrados': json.dumps(resultados['no_encontrados']),
+                'saldo_total_acumulado': resultados['saldo_total_acumulado'],
+            }
+            return _respuesta_binaria(resultados['encontrados'], formato, "Resultado_Busqueda", metadatos)
+
         # Llamamos a la nueva función de lógica que buscrá SOLO por factura
         resultados = buscar_facturas_completas(lista_ids_factura) # Renombrada la función
         
@@ -269,6 +604,43 @@ def buscar_facturas_por_id():
         return jsonify({'success': False, 'message': 'Error durante la búsqueda de facturas.', 'error': str(e)}), 500
 
 
+@app.route('/api/reportes/buscar-facturas/parcial', methods=['GET'])
+@cross_origin()
+@log_execution_time
+@cache.cached(timeout=300, query_string=True)
+def buscar_facturas_parcial_endpoint():
+    """
+    Endpoint para buscar facturas cuando solo se conoce parte del identificador.
+    Acepta `prefijo` (ej. ?prefijo=FCR12) o un rango `desde`/`hasta` sobre el formato
+    de factura completo, y un `limite` opcional de facturas a devolver.
+    """
+    try:
+        prefijo = (request.args.get('prefijo') or '').strip()
+        desde = (request.args.get('desde') or '').strip()
+        hasta = (request.args.get('hasta') or '').strip()
+        limite = request.args.get('limite', settings.BUSQUEDA_PARCIAL_LIMITE, type=int)
+
+        if not prefijo and not desde and not hasta:
+            return jsonify({'success': False, 'message': 'Debe indicar un prefijo o un rango (desde/hasta).'}), 400
+        if desde and hasta and desde > hasta:
+            return jsonify({'success': False, 'message': 'El inicio del rango no puede ser mayor que el final.'}), 400
+
+        # El límite siempre queda entre 1 y el máximo configurado.
+        limite = max(1, min(limite, settings.BUSQUEDA_PARCIAL_LIMITE_MAX))
+
+        resultados = buscar_facturas_parcial(
+            prefijo=prefijo or None,
+            desde=desde or None,
+            hasta=hasta or None,
+            limite=limite
+        )
+        return jsonify({'success': True, 'data': resultados}), 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': 'Error durante la búsqueda parcial de facturas.', 'error': str(e)}), 500
+
+
 @app.route('/api/reportes/buscar-facturas/descargar-excel', methods=['OPTIONS'])
 def handle_excel_download_options():
     response = jsonify({'status': 'ok'})
@@ -280,6 +652,7 @@ def handle_excel_download_options():
 
 @app.route('/api/reportes/buscar-facturas/descargar-excel', methods=['POST'])
 @cross_origin(origins="*", methods=["POST"], headers=["Content-Type"])
+@admision_controlada('descargar_excel_busqueda')
 def descargar_excel_busqueda():
     """
     Endpoint para descargar un reporte en Excel con los resultados de una búsqueda específica.
@@ -316,6 +689,211 @@ def descargar_excel_busqueda():
         traceback.print_exc()
         return jsonify({'success': False, 'message': 'Error al generar el archivo Excel de la búsqueda.', 'error': str(e)}), 500
     
+@app.route('/api/reportes/exportaciones', methods=['POST'])
+@cross_origin()
+@log_execution_time
+def crear_exportacion():
+    """
+    Envía una exportación a Excel para generarla en segundo plano y responde de inmediato (202).
+
+    Cuerpo JSON:
+        {"tipo": "rango", "fecha_inicio": "YYYY-MM-DD", "fecha_fin": "YYYY-MM-DD"}
+        {"tipo": "busqueda", "ids": ["FCR123", ...]}
+
+    El progreso se consulta en `/api/reportes/exportaciones/<id>` y el archivo se descarga en
+    `/api/reportes/exportaciones/<id>/descargar`. Un envío idéntico a otro en curso (o terminado
+    hace poco) devuelve el mismo trabajo en lugar de generar el Excel otra vez.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        tipo = data.get('tipo')
+
+        if tipo == 'rango':
+            fecha_inicio = data.get('fecha_inicio')
+            fecha_fin = data.get('fecha_fin')
+
+            def generar(notificar_progreso):
+                tablas = obtener_tablas_exportacion(fecha_inicio, fecha_fin)
+                if tablas is None:
+                    raise ExportacionSinDatos('No se encontraron datos para generar el Excel con los filtros aplicados.')
+                buffer = generar_excel_en_memoria(tablas, notificar_progreso)
+                return buffer.getvalue(), _nombre_excel_rango(fecha_inicio, fecha_fin)
+
+            estado = gestor_exportaciones.enviar(
+                'rango', {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin},
+                list(NOMBRES_HOJAS_EXCEL.values()), generar,
+                descripcion=f"{fecha_inicio or 'inicio'} a {fecha_fin or 'fin'}"
+            )
+
+        elif tipo == 'busqueda':
+            lista_ids_factura = data.get('ids')
+            if not isinstance(lista_ids_factura, list):
+                return jsonify({'success': False, 'message': 'Los identificadores deben ser una lista.'}), 400
+
+            def generar(notificar_progreso):
+                buffer = generar_excel_busqueda_en_memoria(lista_ids_factura, notificar_progreso)
+                if buffer.getbuffer().nbytes == 0:
+                    raise ExportacionSinDatos('No se encontraron datos para generar el Excel con los IDs proporcionados.')
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                return buffer.getvalue(), f"Reporte_Busqueda_{timestamp}.xlsx"
+
+            estado = gestor_exportaciones.enviar(
+                'busqueda', {'ids': lista_ids_factura}, [NOMBRE_HOJA_BUSQUEDA], generar,
+                descripcion=f"{len(lista_ids_factura)} IDs"
+            )
+
+        else:
+            return jsonify({'success': False, 'message': "El campo 'tipo' debe ser 'rango' o 'busqueda'."}), 400
+
+        return jsonify({'success': True, 'data': estado}), 202, {'Location': f"/api/reportes/exportaciones/{estado['id']}"}
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': 'Error al enviar la exportación.', 'error': str(e)}), 500
+
+
+@app.route('/api/reportes/exportaciones/<trabajo_id>', methods=['GET'])
+@cross_origin()
+def estado_exportacion(trabajo_id):
+    """Devuelve el estado de una exportación: `estado`, `progreso` (0 a 1) y el estado de cada hoja."""
+    estado = gestor_exportaciones.obtener(trabajo_id)
+    if estado is None:
+        return jsonify({'success': False, 'message': 'La exportación no existe o ya expiró.'}), 404
+    return jsonify({'success': True, 'data': estado}), 200
+
+
+@app.route('/api/reportes/exportaciones/<trabajo_id>/descargar', methods=['GET'])
+@cross_origin()
+@log_execution_time
+def descargar_exportacion(trabajo_id):
+    """Descarga el Excel de una exportación terminada (409 si aún no está lista)."""
+    estado = gestor_exportaciones.obtener(trabajo_id)
+    if estado is None:
+        return jsonify({'success': False, 'message': 'La exportación no existe o ya expiró.'}), 404
+
+    ruta = gestor_exportaciones.ruta_archivo(trabajo_id)
+    if ruta is None:
+        return jsonify({'success': False, 'message': f"La exportación no tiene archivo (estado: {estado['estado']}).", 'data': estado}), 409
+
+    return send_file(
+        ruta,
+        as_attachment=True,
+        download_name=estado['nombre_archivo'],
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+@app.route('/api/reportes/snapshot', methods=['GET'])
+@cross_origin()
+@log_execution_time
+@admision_controlada('snapshot')
+def descargar_snapshot():
+    """
+    Exportación masiva para consumidores de BI.
+    Devuelve todos los ítems limpios y categorizados del rango en Parquet (por defecto)
+    o en Arrow IPC si el cliente lo pide con `Accept: application/vnd.apache.arrow.stream`.
+    Sin fechas, exporta todo el histórico.
+    """
+    try:
+        fecha_inicio = request.args.get('fecha_inicio')
+        fecha_fin = request.args.get('fecha_fin')
+
+        # Parquet va primero: ante un comodín (`*/*`, como envían curl o los navegadores) gana él.
+        formato = request.accept_mimetypes.best_match(
+            [MIMETYPE_PARQUET, MIMETYPE_ARROW_STREAM], default=MIMETYPE_PARQUET
+        )
+
+        df_snapshot = obtener_snapshot_rango(fecha_inicio, fecha_fin)
+        if df_snapshot.is_empty():
+            return jsonify({'success': False, 'message': 'No hay datos en el rango de fechas seleccionado.'}), 404
+
+        nombre_periodo = f"{fecha_inicio}_a_{fecha_fin}" if fecha_inicio and fecha_fin else "historico"
+        metadatos = {'fecha_inicio': fecha_inicio or '', 'fecha_fin': fecha_fin or '', 'total_registros': df_snapshot.height}
+        return _respuesta_binaria(df_snapshot, formato, f"Snapshot_Glosas_{nombre_periodo}", metadatos)
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': 'Error al generar el snapshot.', 'error': str(e)}), 500
+
+@app.route('/api/reportes/kpis/suscripcion', methods=['GET'])
+@cross_origin()
+def suscripcion_kpis():
+    """
+    Flujo Server-Sent Events con los KPIs de un rango, para usar con `EventSource` en el navegador.
+
+    Parámetros: `fecha_inicio`, `fecha_fin` y `granularidad` (opcional), como en `analizar-y-comprobar`.
+    Envía un evento `kpis` (con el mismo contenido que `data` de `analizar-y-comprobar`) al conectarse
+    y después solo cuando los datos se recargan y los KPIs del rango cambian; mientras tanto, un latido
+    cada pocos segundos.
+    El servidor cierra el flujo tras `KPI_SSE_DURACION_MAX_SEGUNDOS` y el navegador se reconecta solo.
+    """
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    granularidad = request.args.get('granularidad')
+
+    if granularidad and granularidad not in GRANULARIDADES_INGRESOS:
+        return jsonify({'success': False, 'message': f"Granularidad no válida. Use: {', '.join(GRANULARIDADES_INGRESOS)}."}), 400
+    try:
+        for fecha in (fecha_inicio, fecha_fin):
+            if fecha:
+                datetime.date.fromisoformat(fecha)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Las fechas deben tener el formato YYYY-MM-DD.'}), 400
+
+    suscripcion = notificador_kpis.suscribir(fecha_inicio, fecha_fin, granularidad)
+    if suscripcion is None:
+        return jsonify({
+            'success': False,
+            'message': 'Se alcanzó el máximo de suscripciones en este servidor.'
+        }), 503, {'Retry-After': str(settings.KPI_PUSH_INTERVALO_SEGUNDOS)}
+
+    def generar_eventos():
+        yield f"retry: {SSE_RECONEXION_MS}\n\n"
+        limite = time.monotonic() + settings.KPI_SSE_DURACION_MAX_SEGUNDOS
+        while time.monotonic() < limite:
+            mensaje = suscripcion.esperar(settings.KPI_SSE_LATIDO_SEGUNDOS)
+            # Un comentario SSE (": ...") mantiene viva la conexión y, si el navegador se fue,
+            # hace fallar la escritura para liberar el hilo.
+            yield mensaje or ": latido\n\n"
+
+    respuesta = Response(
+        generar_eventos(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Se cancela al cerrar la respuesta (fin normal, desconexión o error), aunque el generador no haya empezado.
+    respuesta.call_on_close(lambda: notificador_kpis.cancelar(suscripcion))
+    return respuesta
+
+@app.route('/api/reportes/estado-cache', methods=['GET'])
+@cross_origin()
+def estado_cache():
+    """
+    Endpoint de diagnóstico.
+    Devuelve las estadísticas de la caché de DataFrames de este proceso: aciertos, fallos,
+    bytes ocupados frente al presupuesto y entradas/bytes desalojados.
+    """
+    return jsonify({'success': True, 'data': cache_datos.estadisticas()}), 200
+
+@app.route('/api/reportes/estado-carga', methods=['GET'])
+@cross_origin()
+def estado_carga():
+    """
+    Endpoint de diagnóstico.
+    Devuelve, por cada endpoint pesado, las peticiones en curso, en cola, admitidas y rechazadas,
+    las conexiones abiertas de notificación de KPIs y si el precalentamiento de este proceso terminó.
+    """
+    return jsonify({
+        'success': True,
+        'data': {
+            'precalentamiento': {'activo': PRECALENTAMIENTO_ACTIVO, 'listo': precalentamiento_listo.is_set()},
+            **{nombre: limitador.estadisticas() for nombre, limitador in limitadores_pesados.items()},
+            'pesados_global': limitador_pesados_global.estadisticas(),
+            'reparto_hilos': reparto_hilos,
+            'suscripciones_kpis': notificador_kpis.estadisticas()
+        }
+    }), 200
+
 # Punto de entrada para ejecutar la aplicación
 if __name__ == '__main__':
     # 'host=0.0.0.0' hace que el servidor sea accesible desde otros dispositivos en la red.
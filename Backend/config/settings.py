@@ -1,4 +1,5 @@
 # config/settings.py
+import os
 
 # --- Columnas y Mapeos de la NUEVA ESTRUCTURA de BD ---
 # Lista completa de todas las columnas que traeremos con el JOIN
@@ -51,4 +52,74 @@ COLUMN_NAME_MAPPING_EXPORT = {
     "Items_SinCC_ConFR": "Sin CC y Con FR",
     "Items_SinCC_SinFR": "Sin CC y Sin FR",
     "TipoFila": "Tipo de Fila",
-}
\ No newline at end of file
+}
+
+# --- Búsqueda de facturas en streaming ---
+# Número de IDs de la entrada que se procesan (y se envían al cliente) por cada lote.
+# Un lote más pequeño reduce la memoria del servidor a costa de más escaneos de la base.
+BUSQUEDA_STREAM_TAMANO_LOTE = 2000
+
+# --- Búsqueda parcial (prefijo / rango) de facturas ---
+# Máximo de facturas distintas que devuelve una búsqueda parcial si el cliente no indica otro,
+# y tope absoluto que el cliente no puede superar.
+BUSQUEDA_PARCIAL_LIMITE = 100
+BUSQUEDA_PARCIAL_LIMITE_MAX = 1000
+
+# --- Consultas puntuales a la BD ---
+# Cuando el snapshot completo no está en caché, el detalle y la búsqueda de facturas consultan
+# la BD solo por los IDs pedidos. Máximo de valores por cada `IN (...)`.
+CONSULTA_PUNTUAL_TAMANO_LOTE = 500
+# Con más facturas distintas que esto en una búsqueda, cargar el snapshot completo sale más barato
+# que tantas consultas puntuales, y la búsqueda lo usa aunque aún no esté en caché.
+CONSULTA_PUNTUAL_MAX_FACTURAS = 5000
+
+# --- Notificación de KPIs por Server-Sent Events ---
+# Cada cuántos segundos se revisa si el snapshot se recargó (y hay KPIs nuevos que enviar),
+# conexiones SSE simultáneas por proceso (cada una ocupa un hilo del servidor), cada cuántos
+# segundos se envía un latido para detectar navegadores desconectados, y duración máxima de una
+# conexión antes de cerrarla (el navegador se reconecta solo, posiblemente a otro worker).
+KPI_PUSH_INTERVALO_SEGUNDOS = 30
+KPI_SSE_MAX_CONEXIONES = 8
+KPI_SSE_LATIDO_SEGUNDOS = 15
+KPI_SSE_DURACION_MAX_SEGUNDOS = 600
+
+# --- Precalentamiento ---
+# Máximo de segundos que un worker de gunicorn espera a su precalentamiento (PRECALENTAR_AL_INICIO=1)
+# antes de empezar a atender peticiones de todos modos.
+PRECALENTAMIENTO_ESPERA_MAX_SEGUNDOS = 300
+
+# --- Control de admisión para endpoints pesados ---
+# Hilos que atienden peticiones en cada worker. Es la única fuente de ese número: gunicorn.conf.py
+# lo usa como `threads` y la aplicación reparte con él los hilos al arrancar (ver `repartir_hilos_worker`
+# en logic/control_carga.py). Para cambiarlo se define GUNICORN_THREADS en el entorno o en el .env,
+# no `--threads` en la línea de comandos.
+HILOS_POR_WORKER = int(os.getenv("GUNICORN_THREADS", "16"))
+# Hilos que ni las peticiones pesadas ni las suscripciones SSE pueden ocupar: quedan siempre libres
+# para las interactivas (rango de fechas, detalle, búsqueda, resúmenes...). El resto, descontadas las
+# KPI_SSE_MAX_CONEXIONES, es el tope de peticiones pesadas (en ejecución o en cola) de todos los
+# endpoints juntos; por encima de él se responde 503 al instante, sin dejar el hilo esperando.
+HILOS_RESERVADOS_INTERACTIVOS = 4
+# Hilos del pool que ejecuta los trabajos pesados (compartido por todos los endpoints de abajo):
+# limita cuántos corren a la vez, pero el hilo de cada petición sigue ocupado esperando su resultado.
+TRABAJOS_PESADOS_HILOS = 3
+# Por endpoint: (ejecuciones simultáneas, peticiones que pueden esperar en cola). Las ejecuciones
+# simultáneas no superan TRABAJOS_PESADOS_HILOS, y todo cuenta además contra el tope global de arriba.
+# Las que no caben en la cola reciben un 503 con la cabecera Retry-After.
+LIMITES_ENDPOINTS_PESADOS = {
+    "analizar_y_comprobar": (3, 1),
+    "descargar_excel": (2, 1),
+    "descargar_excel_busqueda": (2, 1),
+    "snapshot": (1, 0),
+}
+# Segundos que una petición puede esperar en cola antes de ser rechazada.
+ADMISION_ESPERA_MAX_SEGUNDOS = 15
+# Núcleos que se dejan fuera del pool de hilos de Polars para las peticiones interactivas,
+# salvo que POLARS_MAX_THREADS se fije explícitamente en el entorno.
+NUCLEOS_RESERVADOS_INTERACTIVOS = 1
+
+# --- Exportaciones a Excel en segundo plano ---
+# Trabajos que genera a la vez cada proceso, segundos que se conserva un archivo terminado
+# y segundos sin avanzar tras los que un trabajo en curso se da por perdido.
+EXPORTACION_HILOS = 2
+EXPORTACION_RETENCION_SEGUNDOS = 900
+EXPORTACION_TIEMPO_MAX_SEGUNDOS = 1800
@@ -0,0 +1,197 @@
+# db/indices.py
+"""
+Índices que necesitan las consultas de `mySQL_connector` y revisión de sus planes de ejecución.
+
+Sin estos índices, cada recarga del snapshot, cada filtro por fechas y cada consulta puntual
+terminan en un escaneo completo de las tablas, sin ningún error visible. Se usan desde los
+comandos `flask crear-indices` y `flask revisar-indices` (ver app.py) y, de forma opcional,
+al arrancar la aplicación.
+
+Para probarlos contra una instancia local de MySQL o MariaDB basta con apuntar las variables
+DB_HOST, DB_USER, DB_PASSWORD y DB_DATABASE del .env a ella y ejecutar, desde Backend/:
+    flask --app app crear-indices --solo-mostrar
+    flask --app app crear-indices
+    flask --app app revisar-indices
+"""
+from mysql.connector import Error
+from config import settings
+from db.mySQL_connector import (
+    _obtener_connection_db,
+    _CONSULTA_GLOSAS_BASE,
+    _CONSULTA_RANGO_FECHAS,
+    _CONSULTA_SERIES_FACTURA,
+    _filtro_por_fechas,
+    _filtro_por_docn,
+    _filtro_por_factura,
+)
+
+# (tabla, nombre del índice, columnas en orden, para qué se usa)
+# Los índices "cubrientes" incluyen todas las columnas que lee la consulta base de su tabla,
+# así MySQL/MariaDB responde desde el índice sin ir a leer cada fila.
+INDICES_REQUERIDOS = [
+    (
+        "glo_det", "idx_glo_det_docn_cubriente",
+        [settings.COL_GL_DOCN, settings.COL_ESTATUS, settings.COL_VR_GLOSA, settings.COL_FECHA_OBJECION,
+         settings.COL_FECHA_CONTESTACION, settings.COL_FECHA_RADICADO, settings.COL_CARPETA_CC],
+        "JOIN con la cabecera y detalle por gl_docn",
+    ),
+    (
+        "glo_cab_test", "idx_glo_cab_fecha_cubriente",
+        [settings.COL_FECHA_NOTIFICACION, settings.COL_GL_DOCN, settings.COL_SERIE, settings.COL_N_FACTURA,
+         settings.COL_TIPO, "saldocartera", settings.COL_ENTIDAD],
+        "filtro por rango de fechas y MIN/MAX de fechas",
+    ),
+    (
+        "glo_cab_test", "idx_glo_cab_docn",
+        [settings.COL_GL_DOCN],
+        "JOIN desde el detalle cuando no hay filtro de fechas",
+    ),
+    (
+        "glo_cab_test", "idx_glo_cab_factura",
+        [settings.COL_SERIE, settings.COL_N_FACTURA],
+        "búsqueda de facturas por serie y número, y lista de series",
+    ),
+]
+
+
+def _columnas_indices_existentes(cursor, tablas: list) -> dict:
+    """Devuelve {tabla: [[columnas del índice 1], [columnas del índice 2], ...]} de la BD actual."""
+    placeholders = ", ".join(["%s"] * len(tablas))
+    cursor.execute(
+        f"""
+            SELECT TABLE_NAME AS tabla, INDEX_NAME AS indice, COLUMN_NAME AS columna
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """,
+        tuple(tablas),
+    )
+    indices = {}
+    for fila in cursor.fetchall():
+        indices.setdefault(fila["tabla"], {}).setdefault(fila["indice"], []).append(fila["columna"].lower())
+    return {tabla: list(por_nombre.values()) for tabla, por_nombre in indices.items()}
+
+
+def _indice_cubierto(columnas: list, existentes: list) -> bool:
+    """Un índice ya existe si otro empieza por las mismas columnas en el mismo orden."""
+    requeridas = [columna.lower() for columna in columnas]
+    return any(existente[:len(requeridas)] == requeridas for existente in existentes)
+
+
+def asegurar_indices(solo_mostrar: bool = False) -> tuple:
+    """
+    Crea los índices de `INDICES_REQUERIDOS` que falten. Es idempotente: un índice se
+    omite si ya hay otro que empieza por sus mismas columnas.
+
+    Args:
+        solo_mostrar (bool): Si es True, no modifica la BD; solo indica qué sentencias ejecutaría.
+
+    Returns:
+        tuple: Una tupla (acciones, mensaje_error). 'acciones' es una lista de diccionarios
+               {'tabla', 'indice', 'estado', 'sql'} con estado 'existente', 'pendiente',
+               'creado' o 'error: ...'.
+    """
+    connection = _obtener_connection_db()
+    if not connection:
+        return None, "Fallo al obtener la conexión a la base de datos."
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        existentes = _columnas_indices_existentes(cursor, sorted({tabla for tabla, _, _, _ in INDICES_REQUERIDOS}))
+
+        acciones = []
+        for tabla, nombre, columnas, _ in INDICES_REQUERIDOS:
+            lista_columnas = ", ".join(f"`{columna}`" for columna in columnas)
+            # ALGORITHM=INPLACE / LOCK=NONE: se crea en línea, sin bloquear lecturas ni escrituras.
+            sql = f"CREATE INDEX `{nombre}` ON `{tabla}` ({lista_columnas}) ALGORITHM=INPLACE LOCK=NONE"
+
+            if _indice_cubierto(columnas, existentes.get(tabla, [])):
+                acciones.append({"tabla": tabla, "indice": nombre, "estado": "existente", "sql": sql})
+                continue
+            if solo_mostrar:
+                acciones.append({"tabla": tabla, "indice": nombre, "estado": "pendiente", "sql": sql})
+                continue
+
+            try:
+                print(f"Creando índice {nombre} en {tabla}...")
+                cursor.execute(sql)
+                existentes.setdefault(tabla, []).append([columna.lower() for columna in columnas])
+                acciones.append({"tabla": tabla, "indice": nombre, "estado": "creado", "sql": sql})
+            except Error as e:
+                # Un índice que falla (ej. clave demasiado larga) no impide crear los demás.
+                print(f"Error al crear el índice {nombre}: {e}")
+                acciones.append({"tabla": tabla, "indice": nombre, "estado": f"error: {e}", "sql": sql})
+
+        return acciones, None
+
+    except Error as e:
+        print(f"Error al revisar los índices: {e}")
+        return None, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
+
+
+def _consultas_a_revisar() -> list:
+    """
+    Las consultas reales de la aplicación, con parámetros de ejemplo, junto con cuántas tablas
+    pueden leerse completas. Cargar el histórico entero obliga a recorrer una tabla, pero la
+    otra debe unirse por índice; el resto de consultas no debería recorrer ninguna.
+    """
+    clausula_fechas, params_fechas = _filtro_por_fechas("2024-01-01", "2024-01-31")
+    clausula_docn, params_docn = _filtro_por_docn([0])
+    clausula_factura, params_factura = _filtro_por_factura([("FCR", "0")])
+    return [
+        ("histórico completo", _CONSULTA_GLOSAS_BASE, (), 1),
+        ("rango de fechas", f"{_CONSULTA_GLOSAS_BASE} WHERE {clausula_fechas}", tuple(params_fechas), 0),
+        ("detalle por gl_docn", f"{_CONSULTA_GLOSAS_BASE} WHERE {clausula_docn}", tuple(params_docn), 0),
+        ("búsqueda por factura", f"{_CONSULTA_GLOSAS_BASE} WHERE {clausula_factura}", tuple(params_factura), 0),
+        ("rango de fechas disponible", _CONSULTA_RANGO_FECHAS, (), 0),
+        ("series de factura", _CONSULTA_SERIES_FACTURA, (), 0),
+    ]
+
+
+def revisar_planes_consultas() -> tuple:
+    """
+    Ejecuta `EXPLAIN` sobre cada consulta de la aplicación y advierte cuando el plan
+    incluye más escaneos completos de tabla (`type = ALL`) de los esperados.
+
+    Returns:
+        tuple: Una tupla (advertencias, mensaje_error). 'advertencias' es una lista de textos;
+               vacía si todos los planes usan índices.
+    """
+    connection = _obtener_connection_db()
+    if not connection:
+        return None, "Fallo al obtener la conexión a la base de datos."
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        advertencias = []
+        for nombre, consulta, params, escaneos_permitidos in _consultas_a_revisar():
+            cursor.execute(f"EXPLAIN {consulta.strip().rstrip(';')}", params)
+            plan = cursor.fetchall()
+
+            escaneos = [fila for fila in plan if str(fila.get("type") or "").upper() == "ALL"]
+            resumen_plan = ", ".join(f"{fila.get('table')}:{fila.get('type')}/{fila.get('key') or '-'}" for fila in plan)
+            print(f"Plan '{nombre}': {resumen_plan}")
+
+            if len(escaneos) > escaneos_permitidos:
+                tablas = ", ".join(f"{fila.get('table')} (~{fila.get('rows')} filas)" for fila in escaneos)
+                advertencias.append(f"La consulta '{nombre}' recorre completas: {tablas}. Ejecuta 'flask crear-indices'.")
+
+        return advertencias, None
+
+    except Error as e:
+        print(f"Error al revisar los planes de ejecución: {e}")
+        return None, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
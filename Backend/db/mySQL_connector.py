@@ -32,6 +32,34 @@ def _obtener_connection_db():
         print(f"Error al conectar a MySQL: {e}")
         return None
 
+# La consulta base une las dos tablas. Se usan alias 'c' y 'd' para mayor claridad.
+# Se seleccionan explícitamente las columnas para evitar ambigüedades y mejorar el rendimiento.
+_CONSULTA_GLOSAS_BASE = """
+    SELECT
+        c.fechanotificacion, c.tipo, c.nom_entidad, c.fc_serie, c.fc_docn, c.saldocartera,
+        d.fecha_gl, d.gl_docn, d.estatus1, d.vr_glosa,
+        d.freg, d.gr_docn, d.fecha_rep
+    FROM
+        glo_det d
+    INNER JOIN
+        glo_cab_test c ON d.gl_docn = c.gl_docn
+"""
+
+# Fecha mínima y máxima de notificación, para inicializar los filtros del frontend.
+_CONSULTA_RANGO_FECHAS = f"SELECT MIN(`{settings.COL_FECHA_NOTIFICACION}`) AS fecha_min, MAX(`{settings.COL_FECHA_NOTIFICACION}`) AS fecha_max FROM glo_cab_test;"
+
+# Series de factura distintas, para separar serie y número de los IDs que escribe el usuario.
+# El índice (fc_serie, fc_docn) permite resolverla sin leer la tabla.
+_CONSULTA_SERIES_FACTURA = f"SELECT DISTINCT `{settings.COL_SERIE}` AS serie FROM glo_cab_test;"
+
+# Suma de comprobación del contenido de las dos tablas del JOIN. La calcula el servidor sin enviar
+# filas, así que sirve para saber si los datos cambiaron sin volver a descargar el histórico.
+_CONSULTA_FIRMA_DATOS = "CHECKSUM TABLE glo_det, glo_cab_test;"
+
+def _filtro_por_fechas(fecha_inicio: str, fecha_fin: str) -> tuple:
+    """Cláusula WHERE y parámetros para filtrar por rango de 'fechanotificacion' (días completos)."""
+    return f"c.`{settings.COL_FECHA_NOTIFICACION}` BETWEEN %s AND %s", [f"{fecha_inicio} 00:00:00", f"{fecha_fin} 23:59:59"]
+
 def obtener_datos_glosas(fecha_inicio: str = None, fecha_fin: str = None) -> tuple:
     """
     Obtiene los datos principales uniendo las tablas de detalle ('glo_det') y cabecera ('glo_cab_test').
@@ -51,26 +79,16 @@ def obtener_datos_glosas(fecha_inicio: str = None, fecha_fin: str = None) -> tup
 
     cursor = None
     try:
-        # La consulta base une las dos tablas. Se usan alias 'c' y 'd' para mayor claridad.
-        # Se seleccionan explícitamente las columnas para evitar ambigüedades y mejorar el rendimiento.
-        query = """
-            SELECT
-                c.fechanotificacion, c.tipo, c.nom_entidad, c.fc_serie, c.fc_docn, c.saldocartera,
-                d.fecha_gl, d.gl_docn, d.estatus1, d.vr_glosa,
-                d.freg, d.gr_docn, d.fecha_rep
-            FROM
-                glo_det d
-            INNER JOIN
-                glo_cab_test c ON d.gl_docn = c.gl_docn
-        """
+        query = _CONSULTA_GLOSAS_BASE
         params = [] # Lista para almacenar los valores de los filtros de forma segura.
 
         # Si el usuario proporciona un rango de fechas, se añade dinámicamente el filtro a la consulta.
         if fecha_inicio and fecha_fin:
             # La cláusula WHERE utiliza placeholders (%s). Esto es CRUCIAL para prevenir inyección SQL.
-            query += f" WHERE c.`{settings.COL_FECHA_NOTIFICACION}` BETWEEN %s AND %s"
+            clausula, params_fechas = _filtro_por_fechas(fecha_inicio, fecha_fin)
+            query += f" WHERE {clausula}"
             # Los valores de las fechas se añaden a la lista de parámetros.
-            params.extend([f"{fecha_inicio} 00:00:00", f"{fecha_fin} 23:59:59"])
+            params.extend(params_fechas)
 
         # Se crea un cursor que devuelve las filas como diccionarios.
         cursor = connection.cursor(dictionary=True)
@@ -108,7 +126,7 @@ def obtener_rango_fechas() -> tuple:
     cursor = None
     try:
         # Consulta simple y rápida para obtener los valores extremos del rango de fechas.
-        query = f"SELECT MIN(`{settings.COL_FECHA_NOTIFICACION}`) AS fecha_min, MAX(`{settings.COL_FECHA_NOTIFICACION}`) AS fecha_max FROM glo_cab_test;"
+        query = _CONSULTA_RANGO_FECHAS
         
         cursor = connection.cursor(dictionary=True)
         cursor.execute(query)
@@ -129,4 +147,142 @@ def obtener_rango_fechas() -> tuple:
         if cursor: 
             cursor.close()
         if connection and connection.is_connected():
-            connection.close()
\ No newline at end of file
+            connection.close()
+
+def _filtro_por_docn(lote: list) -> tuple:
+    """Cláusula WHERE y parámetros para buscar un lote de `gl_docn`."""
+    placeholders = ", ".join(["%s"] * len(lote))
+    return f"d.`{settings.COL_GL_DOCN}` IN ({placeholders})", list(lote)
+
+def _filtro_por_factura(lote: list) -> tuple:
+    """Cláusula WHERE y parámetros para buscar un lote de pares (fc_serie, fc_docn)."""
+    placeholders = ", ".join(["(%s, %s)"] * len(lote))
+    params = [valor for par in lote for valor in par]
+    return f"(c.`{settings.COL_SERIE}`, c.`{settings.COL_N_FACTURA}`) IN ({placeholders})", params
+
+def _obtener_glosas_por_lotes(valores: list, construir_filtro) -> tuple:
+    """
+    Ejecuta la consulta base filtrada por una lista de valores, partiéndola en lotes
+    de `settings.CONSULTA_PUNTUAL_TAMANO_LOTE` para no generar un IN gigante.
+    Todos los lotes reutilizan la misma conexión.
+
+    Args:
+        valores (list): Valores a buscar (sin duplicados).
+        construir_filtro (callable): Recibe un lote y devuelve (clausula_where, params).
+
+    Returns:
+        tuple: Una tupla (registros, mensaje_error), igual que `obtener_datos_glosas`.
+    """
+    if not valores:
+        return [], None
+
+    connection = _obtener_connection_db()
+    if not connection:
+        return None, "Fallo al obtener la conexión a la base de datos."
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        registros = []
+        tamano_lote = settings.CONSULTA_PUNTUAL_TAMANO_LOTE
+        for inicio in range(0, len(valores), tamano_lote):
+            clausula, params = construir_filtro(valores[inicio:inicio + tamano_lote])
+            # Igual que en la consulta por fechas, los valores viajan como placeholders (%s).
+            cursor.execute(f"{_CONSULTA_GLOSAS_BASE} WHERE {clausula}", tuple(params))
+            registros.extend(cursor.fetchall())
+        return registros, None
+
+    except Error as e:
+        print(f"Error al ejecutar la consulta puntual: {e}")
+        return None, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
+
+def obtener_glosas_por_docn(lista_docn: list) -> tuple:
+    """
+    Obtiene los ítems de uno o varios `gl_docn` concretos sin cargar todo el histórico.
+    Aprovecha el índice de `gl_docn` en ambas tablas.
+
+    Args:
+        lista_docn (list): Los `gl_docn` a buscar.
+
+    Returns:
+        tuple: Una tupla (registros, mensaje_error).
+    """
+    return _obtener_glosas_por_lotes(list(dict.fromkeys(lista_docn)), _filtro_por_docn)
+
+def obtener_glosas_por_factura(pares_serie_docn: list) -> tuple:
+    """
+    Obtiene los ítems de una lista de facturas identificadas por (fc_serie, fc_docn)
+    sin cargar todo el histórico.
+
+    Args:
+        pares_serie_docn (list): Tuplas (serie, número de factura).
+
+    Returns:
+        tuple: Una tupla (registros, mensaje_error).
+    """
+    return _obtener_glosas_por_lotes(list(dict.fromkeys(pares_serie_docn)), _filtro_por_factura)
+
+def obtener_series_factura() -> tuple:
+    """
+    Obtiene las series de factura distintas de la tabla de cabeceras (normalmente unas pocas).
+
+    Returns:
+        tuple: Una tupla (series, mensaje_error). 'series' es una lista de textos.
+    """
+    connection = _obtener_connection_db()
+    if not connection:
+        return None, "Fallo al obtener la conexión a la base de datos."
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(_CONSULTA_SERIES_FACTURA)
+        return [str(fila["serie"]) for fila in cursor.fetchall() if fila["serie"] is not None], None
+
+    except Error as e:
+        print(f"Error al obtener las series de factura: {e}")
+        return None, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
+
+def obtener_firma_datos() -> tuple:
+    """
+    Obtiene una firma del contenido de 'glo_det' y 'glo_cab_test': cambia si cambia cualquier fila.
+    Es mucho más barata que `obtener_datos_glosas` porque solo viaja un número por tabla.
+
+    Returns:
+        tuple: Una tupla (firma, mensaje_error). 'firma' es un texto comparable entre llamadas.
+    """
+    connection = _obtener_connection_db()
+    if not connection:
+        return None, "Fallo al obtener la conexión a la base de datos."
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(_CONSULTA_FIRMA_DATOS)
+        filas = cursor.fetchall()
+        # CHECKSUM TABLE no falla si una tabla no existe: devuelve NULL en su suma.
+        if not filas or any(fila["Checksum"] is None for fila in filas):
+            return None, "No se pudo calcular la suma de comprobación de las tablas."
+        return ";".join(f"{fila['Table']}={fila['Checksum']}" for fila in filas), None
+
+    except Error as e:
+        print(f"Error al obtener la firma de los datos: {e}")
+        return None, str(e)
+
+    finally:
+        if cursor:
+            cursor.close()
+        if connection and connection.is_connected():
+            connection.close()
@@ -2,6 +2,11 @@
 # Este archivo centraliza las extensiones de Flask para evitar importaciones circulares.
 
 from flask_caching import Cache
+from logic.cache_memoria import CacheMemoria
 
 # Se crea la instancia de la caché aquí, pero se inicializa en app.py
 cache = Cache()
+
+# Caché de DataFrames de la capa de lógica (snapshot, índices, vistas). Va aparte de `cache`
+# para limitarla por bytes y no por número de entradas, y para no serializar los DataFrames con pickle.
+cache_datos = CacheMemoria()
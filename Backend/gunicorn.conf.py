@@ -0,0 +1,65 @@
+# gunicorn.conf.py
+# Configuración para servir la API en producción (Linux):
+#   gunicorn -c gunicorn.conf.py app:app
+
+# Cada worker importa la aplicación. Si el entorno del despliegue (o el .env) define
+# PRECALENTAR_AL_INICIO=1, cada worker carga además el snapshot de datos (ver app.py) y no acepta
+# peticiones hasta terminar (ver `post_worker_init` abajo).
+# NO se usa `preload_app`: si el proceso maestro ejecuta operaciones de Polars antes del fork,
+# su pool de hilos no sobrevive en los workers y estos se bloquean.
+preload_app = False
+
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Igual que en app.py, el .env se carga antes de leer la configuración: GUNICORN_THREADS puede venir de ahí.
+load_dotenv()
+from config import settings  # noqa: E402
+
+bind = "0.0.0.0:5000"
+workers = 2
+# La aplicación reparte entre SSE, peticiones pesadas e interactivas este mismo número de hilos
+# (GUNICORN_THREADS, ver settings.py). Para cambiarlo se define esa variable, no `--threads`.
+threads = settings.HILOS_POR_WORKER
+
+# Las descargas de Excel de rangos grandes pueden tardar bastante más que el resto.
+timeout = 120
+
+
+def post_worker_init(worker):
+    """
+    Avisa si el worker tiene otro número de hilos que el que repartió la aplicación (ej. `--threads`
+    en la línea de comandos sin GUNICORN_THREADS): los topes de admisión no corresponderían a él.
+    """
+    from app import reparto_hilos
+
+    if worker.cfg.threads != reparto_hilos["hilos"]:
+        print(
+            f"ADVERTENCIA: el worker {worker.pid} tiene {worker.cfg.threads} hilos, pero la aplicación repartió "
+            f"{reparto_hilos['hilos']} (GUNICORN_THREADS). Defina GUNICORN_THREADS={worker.cfg.threads} en lugar de --threads."
+        )
+
+    _esperar_precalentamiento(worker)
+
+
+def _esperar_precalentamiento(worker):
+    """
+    Retiene al worker hasta que termine su precalentamiento, para que no reciba tráfico con los
+    datos aún fríos: mientras tanto las conexiones las atienden los workers que ya están listos.
+    Se sigue avisando al maestro para que no lo mate por superar `timeout`.
+    """
+    from app import precalentamiento_listo
+
+    limite = time.monotonic() + settings.PRECALENTAMIENTO_ESPERA_MAX_SEGUNDOS
+    while not precalentamiento_listo.wait(timeout=1):
+        worker.notify()
+        if time.monotonic() > limite:
+            print(
+                f"ADVERTENCIA: el precalentamiento del worker {worker.pid} supera "
+                f"{settings.PRECALENTAMIENTO_ESPERA_MAX_SEGUNDOS} s; empieza a atender sin esperar más."
+            )
+            return
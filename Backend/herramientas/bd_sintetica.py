@@ -0,0 +1,163 @@
+# herramientas/bd_sintetica.py
+"""
+Sustituto de MySQL con datos sintéticos, para pruebas de carga sin base de datos real.
+
+Genera de forma determinista (misma semilla -> mismos datos) filas con la misma forma que
+devuelve el JOIN de `db/mySQL_connector.py`, y ofrece funciones con las mismas firmas y el
+mismo contrato (registros, mensaje_error). `instalar()` las coloca en el módulo del conector;
+debe llamarse ANTES de importar `app` o `logic.data_processor`, que copian las funciones al importarse.
+
+Configuración por variables de entorno (ver `base_desde_entorno`):
+    CARGA_FACTURAS       Número de facturas a generar (por defecto 20000).
+    CARGA_SEMILLA        Semilla aleatoria (por defecto 7).
+    CARGA_LATENCIA_BD_MS Latencia fija simulada por consulta, en ms (por defecto 5).
+"""
+# --- Importaciones ---
+import datetime
+import os
+import random
+import time
+
+from config import settings
+import db.mySQL_connector as conector
+
+ENTIDADES = [
+    "NUEVA EPS", "EPS SURA", "SANITAS", "FAMISANAR", "COOSALUD", "SALUD TOTAL", "COMPENSAR",
+    "MUTUAL SER", "ASMET SALUD", "CAPRESOCA", "EMSSANAR", "SAVIA SALUD", "ALIANSALUD", "POSITIVA",
+]
+# "FE2" termina en dígito a propósito: ejercita la separación serie/número de las consultas puntuales.
+SERIES = ["FCR", "FEV", "FCE", "FE2"]
+TIPOS = ["A", "H", "U"]
+# Unos pocos estatus fuera de VALID_ESTATUS_VALUES, para que el filtro de limpieza tenga trabajo.
+ESTATUS = settings.VALID_ESTATUS_VALUES * 4 + ["XX", "AN"]
+
+FECHA_INICIAL = datetime.date(2022, 1, 1)
+DIAS_HISTORICO = 3 * 365
+
+# Coste simulado de transferir filas desde la BD (ms por cada 1000 filas devueltas).
+LATENCIA_POR_MIL_FILAS_MS = 2.0
+
+
+class BaseSintetica:
+    """Tabla en memoria con el resultado del JOIN glo_det/glo_cab_test y sus consultas."""
+
+    def __init__(self, num_facturas: int = 20000, semilla: int = 7, latencia_ms: float = 5.0):
+        self.latencia_ms = latencia_ms
+        aleatorio = random.Random(semilla)
+
+        self.filas = []
+        self.facturas = []  # (serie, número, gl_docn) de cada factura generada.
+        for i in range(num_facturas):
+            serie = aleatorio.choice(SERIES)
+            numero = 100000 + i
+            gl_docn = 500000 + i
+            fecha_notificacion = FECHA_INICIAL + datetime.timedelta(days=aleatorio.randrange(DIAS_HISTORICO))
+            cabecera = {
+                settings.COL_FECHA_NOTIFICACION: fecha_notificacion,
+                settings.COL_TIPO: aleatorio.choice(TIPOS),
+                settings.COL_ENTIDAD: aleatorio.choice(ENTIDADES),
+                settings.COL_SERIE: serie,
+                settings.COL_N_FACTURA: numero,
+                "saldocartera": float(aleatorio.randrange(10_000, 5_000_000)),
+            }
+            self.facturas.append((serie, numero, gl_docn))
+
+            for _ in range(aleatorio.choice([1, 1, 2, 2, 3, 4, 6])):
+                fecha_objecion = fecha_notificacion + datetime.timedelta(days=aleatorio.randrange(0, 30))
+                contestada = aleatorio.random() < 0.7
+                self.filas.append({
+                    **cabecera,
+                    settings.COL_FECHA_OBJECION: fecha_objecion,
+                    settings.COL_GL_DOCN: gl_docn,
+                    settings.COL_ESTATUS: aleatorio.choice(ESTATUS),
+                    settings.COL_VR_GLOSA: float(aleatorio.randrange(1_000, 900_000)),
+                    settings.COL_FECHA_CONTESTACION: fecha_objecion + datetime.timedelta(days=aleatorio.randrange(1, 20)) if contestada else None,
+                    settings.COL_CARPETA_CC: aleatorio.randrange(1, 5000) if aleatorio.random() < 0.5 else None,
+                    settings.COL_FECHA_RADICADO: fecha_objecion + datetime.timedelta(days=aleatorio.randrange(20, 60)) if aleatorio.random() < 0.4 else None,
+                })
+
+        self.fecha_min = min(fila[settings.COL_FECHA_NOTIFICACION] for fila in self.filas)
+        self.fecha_max = max(fila[settings.COL_FECHA_NOTIFICACION] for fila in self.filas)
+
+        self._por_docn = {}
+        self._por_factura = {}
+        for fila in self.filas:
+            self._por_docn.setdefault(fila[settings.COL_GL_DOCN], []).append(fila)
+            clave = (fila[settings.COL_SERIE], str(fila[settings.COL_N_FACTURA]))
+            self._por_factura.setdefault(clave, []).append(fila)
+
+    def _simular_latencia(self, num_filas: int):
+        time.sleep((self.latencia_ms + num_filas / 1000 * LATENCIA_POR_MIL_FILAS_MS) / 1000)
+
+    # --- Mismas firmas y contrato que db/mySQL_connector.py ---
+
+    def obtener_datos_glosas(self, fecha_inicio: str = None, fecha_fin: str = None) -> tuple:
+        if fecha_inicio and fecha_fin:
+            inicio = datetime.date.fromisoformat(fecha_inicio)
+            fin = datetime.date.fromisoformat(fecha_fin)
+            registros = [fila for fila in self.filas if inicio <= fila[settings.COL_FECHA_NOTIFICACION] <= fin]
+        else:
+            registros = list(self.filas)
+        self._simular_latencia(len(registros))
+        return registros, None
+
+    def obtener_rango_fechas(self) -> tuple:
+        self._simular_latencia(1)
+        return {"fecha_min": self.fecha_min, "fecha_max": self.fecha_max}, None
+
+    @staticmethod
+    def _lotes(valores: list) -> list:
+        """Parte los valores (sin duplicados exactos) en lotes, como `_obtener_glosas_por_lotes`."""
+        valores = list(dict.fromkeys(valores))
+        tamano = settings.CONSULTA_PUNTUAL_TAMANO_LOTE
+        return [valores[inicio:inicio + tamano] for inicio in range(0, len(valores), tamano)]
+
+    def _consultar_por_lotes(self, valores: list, indice: dict, normalizar) -> list:
+        # Como un `IN` de MySQL por lote: los valores se comparan normalizados (el número como entero)
+        # y cada fila sale una sola vez por consulta, aunque varios valores apunten a ella. Entre lotes
+        # distintos no se deduplica, igual que en el conector real.
+        registros = []
+        for lote in self._lotes(valores):
+            for clave in dict.fromkeys(normalizar(valor) for valor in lote):
+                registros.extend(indice.get(clave, []))
+        return registros
+
+    def obtener_series_factura(self) -> tuple:
+        self._simular_latencia(1)
+        return sorted({serie for serie, _, _ in self.facturas}), None
+
+    def obtener_firma_datos(self) -> tuple:
+        # Las filas no cambian después de generarse: la firma es siempre la misma.
+        self._simular_latencia(1)
+        return f"sintetica={len(self.filas)}", None
+
+    def obtener_glosas_por_docn(self, lista_docn: list) -> tuple:
+        registros = self._consultar_por_lotes(lista_docn, self._por_docn, int)
+        self._simular_latencia(len(registros))
+        return registros, None
+
+    def obtener_glosas_por_factura(self, pares_serie_docn: list) -> tuple:
+        registros = self._consultar_por_lotes(
+            pares_serie_docn, self._por_factura, lambda par: (par[0], str(int(par[1])))
+        )
+        self._simular_latencia(len(registros))
+        return registros, None
+
+
+def base_desde_entorno() -> BaseSintetica:
+    """Crea la base sintética con la configuración de las variables CARGA_*."""
+    return BaseSintetica(
+        num_facturas=int(os.getenv("CARGA_FACTURAS", "20000")),
+        semilla=int(os.getenv("CARGA_SEMILLA", "7")),
+        latencia_ms=float(os.getenv("CARGA_LATENCIA_BD_MS", "5")),
+    )
+
+
+def instalar(base: BaseSintetica):
+    """Sustituye las consultas del conector de MySQL por las de la base sintética."""
+    conector.obtener_datos_glosas = base.obtener_datos_glosas
+    conector.obtener_rango_fechas = base.obtener_rango_fechas
+    conector.obtener_glosas_por_docn = base.obtener_glosas_por_docn
+    conector.obtener_glosas_por_factura = base.obtener_glosas_por_factura
+    conector.obtener_series_factura = base.obtener_series_factura
+    conector.obtener_firma_datos = base.obtener_firma_datos
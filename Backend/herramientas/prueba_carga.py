@@ -0,0 +1,475 @@
+# herramientas/prueba_carga.py
+"""
+Prueba de carga que reproduce el tráfico del dashboard contra la aplicación real servida
+con la base sintética (`servidor_sintetico`), para medir rendimiento y latencias de cola.
+
+Cada usuario virtual repite sesiones como las que genera el frontend:
+    1. `rango-fechas` al abrir el dashboard.
+    2. `analizar-y-comprobar` sobre un rango (rangos habituales compartidos por varios usuarios
+       y rangos arbitrarios), y a veces `ingresos` al cambiar la granularidad.
+    3. Varias páginas de `resumenes-paginados` de una categoría, a veces filtradas por entidad.
+    4. Una ráfaga de `detalle-factura` al desplegar facturas.
+    5. De vez en cuando, `buscar-facturas` con una lista grande de IDs, su Excel síncrono, el
+       Excel síncrono del rango (`descargar-excel`) o una exportación a Excel en segundo plano
+       (envío, consultas de progreso y descarga).
+
+Para cada configuración de workers x hilos se arranca un servidor nuevo (gunicorn si está
+disponible, si no el servidor de desarrollo de werkzeug), se calienta, se mide y se detiene.
+Los hilos llegan al servidor por GUNICORN_THREADS, la misma variable con la que la aplicación
+reparte sus topes de admisión, y el informe muestra ese reparto.
+El informe muestra, por endpoint: peticiones, peticiones por segundo, p50/p95/p99, errores
+y rechazos por saturación (503).
+
+Uso, desde la carpeta Backend/:
+    python -m herramientas.prueba_carga --configuraciones 1x4,2x4,4x2 --usuarios 16 --duracion 30
+    python -m herramientas.prueba_carga --servidor werkzeug --configuraciones 1x8 --json resultados.json
+
+NOTA: el generador corre en un solo proceso de Python; con muchos usuarios virtuales puede
+ser él el cuello de botella. Conviene comparar configuraciones con el mismo número de usuarios.
+"""
+# --- Importaciones ---
+import argparse
+import datetime
+import http.client
+import importlib.util
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from herramientas.bd_sintetica import ENTIDADES, base_desde_entorno
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Mezcla de tráfico por sesión ---
+PROB_INGRESOS = 0.25            # Cambia la granularidad del gráfico de ingresos.
+PROB_FILTRO_ENTIDAD = 0.3       # Abre el detalle de una categoría filtrado por entidad.
+PROB_BUSQUEDA = 0.2             # Busca una lista grande de facturas.
+PROB_EXCEL_BUSQUEDA = 0.03      # Descarga el Excel síncrono de una búsqueda pequeña.
+PROB_EXCEL_RANGO = 0.03         # Descarga el Excel síncrono del rango (endpoint pesado con admisión).
+PROB_EXPORTACION = 0.05         # Exporta el rango a Excel en segundo plano.
+PAGINAS_POR_SESION = (1, 4)
+DETALLES_POR_RAFAGA = (3, 12)
+IDS_POR_BUSQUEDA = (500, 3000)
+PROPORCION_IDS_INEXISTENTES = 0.1
+INTERVALO_PROGRESO_EXPORTACION_S = 0.5
+
+# Mismas combinaciones de categorías que envía el frontend al abrir el detalle.
+CATEGORIAS_DETALLE = ["T1", "T2,T3,T4,Mixtas", "T2", "T3", "T4", "Mixtas"]
+GRANULARIDADES = ["diario", "mensual", "anual"]
+
+PERCENTILES = (50, 95, 99)
+
+
+class _TiempoAgotado(Exception):
+    """La medición terminó: el usuario virtual no debe lanzar más peticiones."""
+
+
+class Metricas:
+    """Latencias y códigos de estado por endpoint, compartidos por todos los usuarios virtuales."""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._muestras = {}
+        self.activa = True
+
+    def registrar(self, endpoint: str, duracion_ms: float, estado):
+        if not self.activa:
+            return
+        with self._candado:
+            self._muestras.setdefault(endpoint, []).append((duracion_ms, estado))
+
+    def resumen(self, duracion_s: float) -> dict:
+        """Devuelve {endpoint: {peticiones, rps, p50_ms, p95_ms, p99_ms, errores, rechazadas}}."""
+        with self._candado:
+            muestras = {endpoint: list(valores) for endpoint, valores in self._muestras.items()}
+        muestras["TOTAL"] = [muestra for endpoint, valores in muestras.items() for muestra in valores if not endpoint.startswith("(")]
+
+        resumen = {}
+        for endpoint, valores in muestras.items():
+            latencias = sorted(duracion for duracion, _ in valores)
+            errores = sum(1 for _, estado in valores if estado == "excepcion" or (estado >= 400 and estado != 503))
+            rechazadas = sum(1 for _, estado in valores if estado == 503)
+            resumen[endpoint] = {
+                "peticiones": len(valores),
+                "rps": round(len(valores) / duracion_s, 2) if duracion_s else 0,
+                **{f"p{p}_ms": round(_percentil(latencias, p), 2) for p in PERCENTILES},
+                "errores": errores,
+                "rechazadas": rechazadas,
+            }
+        return resumen
+
+
+def _percentil(valores_ordenados: list, percentil: float) -> float:
+    """Percentil por rango más cercano (sin interpolar)."""
+    if not valores_ordenados:
+        return 0.0
+    posicion = max(math.ceil(percentil / 100 * len(valores_ordenados)) - 1, 0)
+    return valores_ordenados[posicion]
+
+
+class ClienteHttp:
+    """Cliente HTTP de un usuario virtual: reutiliza la conexión (keep-alive) como un navegador."""
+
+    def __init__(self, puerto: int, metricas: Metricas, fin: float):
+        self.puerto = puerto
+        self.metricas = metricas
+        self.fin = fin
+        self._conexion = None
+
+    def _conectar(self):
+        self._conexion = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=180)
+
+    def pedir(self, endpoint: str, metodo: str, ruta: str, cuerpo=None) -> tuple:
+        """Hace una petición y registra su latencia. Devuelve (estado, cuerpo_bytes)."""
+        if time.monotonic() > self.fin:
+            raise _TiempoAgotado()
+
+        cabeceras = {"Accept": "application/json"}
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode("utf-8")
+            cabeceras["Content-Type"] = "application/json"
+
+        inicio = time.perf_counter()
+        for intento in range(2):
+            try:
+                if self._conexion is None:
+                    self._conectar()
+                self._conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+                respuesta = self._conexion.getresponse()
+                contenido = respuesta.read()
+                if respuesta.getheader("Connection", "").lower() == "close" or respuesta.version == 10:
+                    self._conexion.close()
+                    self._conexion = None
+                self.metricas.registrar(endpoint, (time.perf_counter() - inicio) * 1000, respuesta.status)
+                return respuesta.status, contenido
+            except (http.client.HTTPException, OSError):
+                # El servidor pudo cerrar la conexión reutilizada: se reintenta una vez con una nueva.
+                if self._conexion is not None:
+                    self._conexion.close()
+                self._conexion = None
+                if intento == 1:
+                    self.metricas.registrar(endpoint, (time.perf_counter() - inicio) * 1000, "excepcion")
+                    return None, None
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+
+
+class Escenario:
+    """Genera los parámetros de las sesiones a partir de la misma base sintética que usa el servidor."""
+
+    def __init__(self, base):
+        self.fecha_min = base.fecha_min
+        self.fecha_max = base.fecha_max
+        self.ids_factura = [f"{serie}{numero}" for serie, numero, _ in base.facturas]
+        self.docns = [gl_docn for _, _, gl_docn in base.facturas]
+        self.rangos_habituales = self._rangos_habituales()
+
+    def _rangos_habituales(self) -> list:
+        """Meses, trimestres y años completos: los rangos que más se repiten entre usuarios."""
+        rangos = []
+        for anio in range(self.fecha_min.year, self.fecha_max.year + 1):
+            rangos.append((datetime.date(anio, 1, 1), datetime.date(anio, 12, 31)))
+            for mes_inicial in (1, 4, 7, 10):
+                fin_trimestre = datetime.date(anio + (mes_inicial == 10), (mes_inicial + 3) % 12 or 12, 1) - datetime.timedelta(days=1)
+                rangos.append((datetime.date(anio, mes_inicial, 1), fin_trimestre))
+        rangos.append((self.fecha_min, self.fecha_max))
+        return [(inicio.isoformat(), fin.isoformat()) for inicio, fin in rangos]
+
+    def rango(self, aleatorio: random.Random) -> tuple:
+        if aleatorio.random() < 0.7:
+            return aleatorio.choice(self.rangos_habituales)
+        dias_totales = (self.fecha_max - self.fecha_min).days
+        duracion = aleatorio.choice([7, 30, 90, 180, 365, 730])
+        inicio = self.fecha_min + datetime.timedelta(days=aleatorio.randrange(max(dias_totales - duracion, 1)))
+        return inicio.isoformat(), min(inicio + datetime.timedelta(days=duracion), self.fecha_max).isoformat()
+
+    def lista_ids(self, aleatorio: random.Random, cantidad: int) -> list:
+        ids = aleatorio.sample(self.ids_factura, min(cantidad, len(self.ids_factura)))
+        inexistentes = int(len(ids) * PROPORCION_IDS_INEXISTENTES)
+        return ids[inexistentes:] + [f"ZZZ{aleatorio.randrange(10**6)}" for _ in range(inexistentes)]
+
+    def sesion(self, cliente: ClienteHttp, aleatorio: random.Random, pausa):
+        """Una visita completa al dashboard."""
+        cliente.pedir("rango-fechas", "GET", "/api/reportes/rango-fechas")
+        pausa()
+
+        fecha_inicio, fecha_fin = self.rango(aleatorio)
+        parametros_rango = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+        cliente.pedir("analizar-y-comprobar", "GET", f"/api/reportes/analizar-y-comprobar?{urlencode(parametros_rango)}")
+        pausa()
+
+        if aleatorio.random() < PROB_INGRESOS:
+            parametros = {**parametros_rango, "granularidad": aleatorio.choice(GRANULARIDADES)}
+            cliente.pedir("ingresos", "GET", f"/api/reportes/ingresos?{urlencode(parametros)}")
+            pausa()
+
+        parametros_detalle = {**parametros_rango, "categorias": aleatorio.choice(CATEGORIAS_DETALLE)}
+        if aleatorio.random() < PROB_FILTRO_ENTIDAD:
+            parametros_detalle["entidad"] = aleatorio.choice(ENTIDADES)
+        for pagina in range(1, aleatorio.randint(*PAGINAS_POR_SESION) + 1):
+            cliente.pedir("resumenes-paginados", "GET", f"/api/reportes/resumenes-paginados?{urlencode({**parametros_detalle, 'pagina': pagina})}")
+            pausa()
+
+        for _ in range(aleatorio.randint(*DETALLES_POR_RAFAGA)):
+            cliente.pedir("detalle-factura", "GET", f"/api/reportes/detalle-factura?docn={aleatorio.choice(self.docns)}")
+
+        if aleatorio.random() < PROB_BUSQUEDA:
+            ids = self.lista_ids(aleatorio, aleatorio.randint(*IDS_POR_BUSQUEDA))
+            cliente.pedir("buscar-facturas", "POST", "/api/reportes/buscar-facturas", {"ids": ids})
+            pausa()
+
+        if aleatorio.random() < PROB_EXCEL_BUSQUEDA:
+            ids = self.lista_ids(aleatorio, aleatorio.randint(5, 50))
+            cliente.pedir("buscar-facturas/descargar-excel", "POST", "/api/reportes/buscar-facturas/descargar-excel", {"ids": ids})
+            pausa()
+
+        if aleatorio.random() < PROB_EXCEL_RANGO:
+            cliente.pedir("descargar-excel", "GET", f"/api/reportes/descargar-excel?{urlencode(parametros_rango)}")
+            pausa()
+
+        if aleatorio.random() < PROB_EXPORTACION:
+            self._exportar(cliente, parametros_rango)
+
+    @staticmethod
+    def _exportar(cliente: ClienteHttp, parametros_rango: dict):
+        """Exportación en segundo plano tal como la hace el botón de descarga del dashboard."""
+        inicio = time.perf_counter()
+        estado, contenido = cliente.pedir("exportaciones (envío)", "POST", "/api/reportes/exportaciones", {"tipo": "rango", **parametros_rango})
+        if estado != 202:
+            return
+        trabajo = json.loads(contenido)["data"]
+        while trabajo["estado"] in ("en_cola", "procesando"):
+            time.sleep(INTERVALO_PROGRESO_EXPORTACION_S)
+            estado, contenido = cliente.pedir("exportaciones (progreso)", "GET", f"/api/reportes/exportaciones/{trabajo['id']}")
+            if estado != 200:
+                return
+            trabajo = json.loads(contenido)["data"]
+        if trabajo["estado"] == "completado":
+            estado, _ = cliente.pedir("exportaciones (descarga)", "GET", f"/api/reportes/exportaciones/{trabajo['id']}/descargar")
+            # Tiempo percibido por el usuario desde que pulsa el botón hasta tener el archivo.
+            cliente.metricas.registrar("(exportación de extremo a extremo)", (time.perf_counter() - inicio) * 1000, estado)
+
+
+# ==============================================================================
+# SECCIÓN: GESTIÓN DEL SERVIDOR
+# ==============================================================================
+
+def gunicorn_disponible() -> bool:
+    return os.name != "nt" and importlib.util.find_spec("gunicorn") is not None
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(tipo_servidor: str, workers: int, hilos: int, puerto: int, entorno: dict, ruta_log: str) -> subprocess.Popen:
+    # gunicorn.conf.py toma los hilos de GUNICORN_THREADS y la aplicación reparte ese mismo número
+    # entre SSE, peticiones pesadas e interactivas: así cada configuración mide sus propios topes.
+    entorno = {**entorno, "GUNICORN_THREADS": str(hilos)}
+    if tipo_servidor == "gunicorn":
+        # Se carga el gunicorn.conf.py de producción (su hook retiene a cada worker hasta que termina
+        # el precalentamiento), pero los argumentos de la línea de comandos mandan sobre él.
+        comando = [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "-w", str(workers), "-b", f"127.0.0.1:{puerto}",
+            "--timeout", "180", "herramientas.servidor_sintetico:app",
+        ]
+    else:
+        comando = [sys.executable, "-m", "herramientas.servidor_sintetico", "--puerto", str(puerto)]
+
+    log = open(ruta_log, "w", encoding="utf-8")
+    return subprocess.Popen(comando, cwd=DIRECTORIO_BACKEND, env=entorno, stdout=log, stderr=subprocess.STDOUT)
+
+
+def esperar_servidor(proceso: subprocess.Popen, puerto: int, espera_max_s: float = 180) -> dict:
+    """
+    Espera a la primera respuesta de un proceso con el precalentamiento terminado (si se pidió):
+    hasta entonces las peticiones no serían representativas de un servidor listo.
+    Devuelve los datos de `/estado-carga` de esa respuesta.
+    """
+    limite = time.monotonic() + espera_max_s
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de estar listo (revisa su log).")
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=5)
+            conexion.request("GET", "/api/reportes/estado-carga")
+            respuesta = conexion.getresponse()
+            if respuesta.status == 200:
+                estado_carga = json.loads(respuesta.read())["data"]
+                if estado_carga["precalentamiento"]["listo"]:
+                    return estado_carga
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"El servidor no respondió en {espera_max_s} s.")
+
+
+def detener_servidor(proceso: subprocess.Popen):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+# ==============================================================================
+# SECCIÓN: EJECUCIÓN DE LA PRUEBA
+# ==============================================================================
+
+def _ejecutar_usuarios(escenario: Escenario, puerto: int, usuarios: int, duracion_s: float, pausa_ms: float, semilla: int, metricas: Metricas):
+    fin = time.monotonic() + duracion_s
+
+    def usuario_virtual(numero: int):
+        aleatorio = random.Random(semilla * 1000 + numero)
+        cliente = ClienteHttp(puerto, metricas, fin)
+        pausa = lambda: time.sleep(aleatorio.uniform(0, 2 * pausa_ms) / 1000)
+        try:
+            while time.monotonic() < fin:
+                escenario.sesion(cliente, aleatorio, pausa)
+        except _TiempoAgotado:
+            pass
+        finally:
+            cliente.cerrar()
+
+    hilos = [threading.Thread(target=usuario_virtual, args=(numero,), daemon=True) for numero in range(usuarios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+
+def ejecutar_configuracion(argumentos, escenario: Escenario, workers: int, hilos: int) -> dict:
+    """Arranca un servidor con la configuración dada, lo calienta, lo mide y lo detiene."""
+    puerto = _puerto_libre()
+    entorno = {
+        **os.environ,
+        "CARGA_FACTURAS": str(argumentos.facturas),
+        "CARGA_SEMILLA": str(argumentos.semilla),
+        "CARGA_LATENCIA_BD_MS": str(argumentos.latencia_bd_ms),
+        "PRECALENTAR_AL_INICIO": "1" if argumentos.precalentar else "0",
+        # Cada configuración empieza sin exportaciones de corridas anteriores.
+        "EXPORTACION_DIR": tempfile.mkdtemp(prefix="exportaciones_carga_"),
+    }
+    ruta_log = os.path.join(tempfile.gettempdir(), f"prueba_carga_{argumentos.servidor}_{workers}x{hilos}.log")
+
+    print(f"\nArrancando {argumentos.servidor} con {workers} worker(s) x {hilos} hilo(s) en el puerto {puerto} (log: {ruta_log})...")
+    proceso = iniciar_servidor(argumentos.servidor, workers, hilos, puerto, entorno, ruta_log)
+    try:
+        inicio_arranque = time.perf_counter()
+        estado_carga = esperar_servidor(proceso, puerto)
+        primera_respuesta_rapida_ms = (time.perf_counter() - inicio_arranque) * 1000
+
+        if argumentos.calentamiento > 0:
+            print(f"Calentando durante {argumentos.calentamiento} s (no se mide)...")
+            metricas_calentamiento = Metricas()
+            _ejecutar_usuarios(escenario, puerto, argumentos.usuarios, argumentos.calentamiento, argumentos.pausa_ms, argumentos.semilla + 1, metricas_calentamiento)
+
+        print(f"Midiendo {argumentos.usuarios} usuarios durante {argumentos.duracion} s...")
+        metricas = Metricas()
+        inicio = time.perf_counter()
+        _ejecutar_usuarios(escenario, puerto, argumentos.usuarios, argumentos.duracion, argumentos.pausa_ms, argumentos.semilla, metricas)
+        duracion_real = time.perf_counter() - inicio
+        metricas.activa = False
+    finally:
+        detener_servidor(proceso)
+
+    return {
+        "servidor": argumentos.servidor,
+        "workers": workers,
+        "hilos": hilos,
+        "usuarios": argumentos.usuarios,
+        "duracion_s": round(duracion_real, 2),
+        "primera_respuesta_rapida_ms": round(primera_respuesta_rapida_ms, 2),
+        "reparto_hilos": estado_carga["reparto_hilos"],
+        "endpoints": metricas.resumen(duracion_real),
+    }
+
+
+def imprimir_resultado(resultado: dict):
+    print(
+        f"\n=== {resultado['servidor']} {resultado['workers']} worker(s) x {resultado['hilos']} hilo(s) | "
+        f"{resultado['usuarios']} usuarios | {resultado['duracion_s']} s | primera respuesta rápida en {resultado['primera_respuesta_rapida_ms']:.0f} ms ==="
+    )
+    reparto = resultado["reparto_hilos"]
+    print(
+        f"GUNICORN_THREADS={reparto['hilos']}: {reparto['max_conexiones_sse']} conexiones SSE, "
+        f"{reparto['max_peticiones_pesadas']} peticiones pesadas, {reparto['reservados_interactivos']} hilos reservados"
+    )
+    cabecera = f"{'endpoint':<38}{'peticiones':>11}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>9}{'503':>7}"
+    print(cabecera)
+    print("-" * len(cabecera))
+    endpoints = resultado["endpoints"]
+    for endpoint in sorted(endpoints, key=lambda nombre: (nombre == "TOTAL", nombre)):
+        fila = endpoints[endpoint]
+        print(
+            f"{endpoint:<38}{fila['peticiones']:>11}{fila['rps']:>9.2f}{fila['p50_ms']:>10.1f}{fila['p95_ms']:>10.1f}"
+            f"{fila['p99_ms']:>10.1f}{fila['errores']:>9}{fila['rechazadas']:>7}"
+        )
+
+
+def _leer_configuraciones(texto: str) -> list:
+    configuraciones = []
+    for parte in texto.split(","):
+        workers, hilos = parte.lower().strip().split("x")
+        configuraciones.append((int(workers), int(hilos)))
+    return configuraciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del dashboard con datos sintéticos.")
+    parser.add_argument("--configuraciones", default="1x4,2x4", help="Lista 'workersxhilos' separada por comas (ej. 1x4,2x4,4x2).")
+    parser.add_argument("--servidor", choices=["auto", "gunicorn", "werkzeug"], default="auto")
+    parser.add_argument("--usuarios", type=int, default=16, help="Usuarios virtuales simultáneos.")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de medición por configuración.")
+    parser.add_argument("--calentamiento", type=float, default=5, help="Segundos de tráfico previo que no se miden.")
+    parser.add_argument("--pausa-ms", type=float, default=100, help="Pausa media entre acciones de un usuario.")
+    parser.add_argument("--facturas", type=int, default=20000, help="Facturas de la base sintética.")
+    parser.add_argument("--latencia-bd-ms", type=float, default=5, help="Latencia simulada por consulta a la BD.")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--precalentar", action="store_true", help="Arranca los workers con PRECALENTAR_AL_INICIO=1.")
+    parser.add_argument("--json", help="Ruta donde guardar los resultados en JSON.")
+    argumentos = parser.parse_args()
+
+    if argumentos.servidor == "auto":
+        argumentos.servidor = "gunicorn" if gunicorn_disponible() else "werkzeug"
+    elif argumentos.servidor == "gunicorn" and not gunicorn_disponible():
+        parser.error("gunicorn no está instalado (o el sistema es Windows). Use --servidor werkzeug.")
+
+    configuraciones = _leer_configuraciones(argumentos.configuraciones)
+    if argumentos.servidor == "werkzeug" and any(workers > 1 for workers, _ in configuraciones):
+        print("AVISO: werkzeug usa un solo proceso; el número de workers se ignora y los hilos no tienen límite.")
+
+    # Misma semilla y tamaño que el servidor: los IDs y gl_docn que se piden existen en sus datos.
+    os.environ["CARGA_FACTURAS"] = str(argumentos.facturas)
+    os.environ["CARGA_SEMILLA"] = str(argumentos.semilla)
+    escenario = Escenario(base_desde_entorno())
+
+    resultados = []
+    for workers, hilos in configuraciones:
+        resultado = ejecutar_configuracion(argumentos, escenario, workers, hilos)
+        imprimir_resultado(resultado)
+        resultados.append(resultado)
+
+    if argumentos.json:
+        with open(argumentos.json, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {argumentos.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# herramientas/servidor_sintetico.py
+"""
+La aplicación Flask real, pero con la base sintética de `bd_sintetica` en lugar de MySQL.
+
+Desde la carpeta Backend/:
+    GUNICORN_THREADS=4 gunicorn -c gunicorn.conf.py -w 2 -b 127.0.0.1:5001 herramientas.servidor_sintetico:app
+    python -m herramientas.servidor_sintetico --puerto 5001
+"""
+import argparse
+
+from herramientas.bd_sintetica import base_desde_entorno, instalar
+
+# Debe ocurrir antes de importar `app`, que copia las funciones del conector al importarse.
+instalar(base_desde_entorno())
+
+from app import app  # noqa: E402
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor de desarrollo (werkzeug) con datos sintéticos.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=5001)
+    argumentos = parser.parse_args()
+    app.run(host=argumentos.host, port=argumentos.puerto, threaded=True, debug=False)
@@ -0,0 +1,299 @@
+# logic/cache_memoria.py
+"""
+Caché en memoria con presupuesto de bytes para los DataFrames de la capa de lógica.
+
+A diferencia del caché 'simple' de Flask-Caching (limitado por número de entradas y que
+serializa cada valor con pickle), este caché:
+- Mide cada entrada con `estimated_size()` de Polars y respeta un máximo de bytes.
+- Desaloja por LRU teniendo en cuenta el coste: entre las entradas menos usadas recientemente,
+  sale primero la que menos costó calcular por cada byte que ocupa.
+- Guarda los objetos tal cual (sin pickle), así que un acierto no copia el DataFrame.
+- Evita que varios hilos calculen a la vez la misma entrada (ej. el snapshot completo).
+- Permite fijar entradas imprescindibles (el snapshot y su versión): nunca se desalojan por
+  espacio y se admiten aunque superen el presupuesto, avisando en consola.
+- Expone estadísticas de aciertos, fallos y bytes desalojados.
+"""
+# --- Importaciones ---
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import polars as pl
+
+# Cuántas de las entradas menos usadas recientemente se comparan al elegir cuál desalojar.
+CANDIDATOS_DESALOJO = 8
+
+
+def estimar_tamano(valor) -> int:
+    """
+    Estima los bytes que ocupa un valor cacheado.
+    Usa `estimated_size()` para DataFrames/Series de Polars y recorre dicts, listas y tuplas.
+    """
+    if isinstance(valor, (pl.DataFrame, pl.Series)):
+        return valor.estimated_size()
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_tamano(k) + estimar_tamano(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(estimar_tamano(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class _Entrada:
+    """Valor cacheado junto con su tamaño, coste de cálculo, expiración y si está fijada."""
+    __slots__ = ("valor", "tamano", "coste", "expira", "fija")
+
+    def __init__(self, valor, tamano: int, coste: float, expira: float, fija: bool = False):
+        self.valor = valor
+        self.tamano = tamano
+        self.coste = coste
+        self.expira = expira
+        self.fija = fija
+
+
+class CacheMemoria:
+    """
+    Caché LRU con presupuesto de bytes. Se crea en `extensions.py` y se configura
+    en `app.py` con `init_app`, igual que las demás extensiones.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, default_timeout: int = 300):
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self._entradas = OrderedDict()  # clave -> _Entrada, de la menos a la más usada recientemente.
+        self._bytes_actuales = 0
+        self._candado = threading.RLock()
+        # Un candado por clave en cálculo: clave -> [candado, hilos que lo usan]. Con un candado por
+        # clave (y no un grupo repartido por hash) una función memoizada puede llamar a otra sin
+        # riesgo de esperar por un candado que ya tiene el mismo hilo.
+        self._candados_calculo = {}
+        self._estadisticas = {
+            "aciertos": 0,
+            "fallos": 0,
+            "entradas_desalojadas": 0,
+            "bytes_desalojados": 0,
+            "entradas_expiradas": 0,
+            "entradas_rechazadas": 0,
+            "entradas_fijas_sobre_presupuesto": 0,
+        }
+
+    def init_app(self, app, config: dict = None):
+        """Lee `CACHE_DATOS_MAX_BYTES` y `CACHE_DATOS_DEFAULT_TIMEOUT` de la configuración."""
+        config = {**app.config, **(config or {})}
+        self.max_bytes = int(config.get("CACHE_DATOS_MAX_BYTES", self.max_bytes))
+        self.default_timeout = int(config.get("CACHE_DATOS_DEFAULT_TIMEOUT", self.default_timeout))
+        app.extensions["cache_datos"] = self
+
+    # --------------------------------------------------------------------------
+    # Operaciones básicas
+    # --------------------------------------------------------------------------
+
+    def _buscar(self, clave: str, contar: bool = True) -> tuple:
+        """Devuelve (encontrado, valor), descartando la entrada si ya expiró."""
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada.expira < time.monotonic():
+                self._quitar(clave)
+                self._estadisticas["entradas_expiradas"] += 1
+                entrada = None
+
+            if entrada is None:
+                if contar:
+                    self._estadisticas["fallos"] += 1
+                return False, None
+
+            self._entradas.move_to_end(clave)
+            if contar:
+                self._estadisticas["aciertos"] += 1
+            return True, entrada.valor
+
+    def get(self, clave: str):
+        """Devuelve el valor cacheado o None si no existe o expiró."""
+        return self._buscar(clave)[1]
+
+    def set(self, clave: str, valor, timeout: int = None, coste: float = 0.0, fija: bool = False) -> bool:
+        """
+        Guarda un valor, desalojando otras entradas si hace falta espacio.
+
+        Args:
+            clave (str): Clave de la entrada.
+            valor: Objeto a guardar (no se copia).
+            timeout (int, optional): Segundos de vida; por defecto `default_timeout`.
+            coste (float): Segundos que costó calcular el valor; protege a las entradas caras.
+            fija (bool): La entrada no se desaloja por espacio (solo expira) y se guarda siempre,
+                aunque no quepa en el presupuesto. Para datos cuya pérdida obliga a recalcular todo.
+
+        Returns:
+            bool: False si el valor no cabe en el presupuesto (ni desalojando) y no se guardó.
+        """
+        tamano = estimar_tamano(valor)
+        expira = time.monotonic() + (self.default_timeout if timeout is None else timeout)
+
+        with self._candado:
+            self._quitar(clave)
+            self._liberar_espacio(tamano)
+
+            if self._bytes_actuales + tamano > self.max_bytes:
+                if not fija:
+                    self._estadisticas["entradas_rechazadas"] += 1
+                    print(f"Caché de datos: '{clave}' ({tamano / 1e6:.1f} MB) no cabe en el presupuesto y no se guarda.")
+                    return False
+                self._estadisticas["entradas_fijas_sobre_presupuesto"] += 1
+                print(
+                    f"ADVERTENCIA: la caché de datos supera su presupuesto ({self.max_bytes / 1e6:.1f} MB) para guardar "
+                    f"'{clave}' ({tamano / 1e6:.1f} MB). Aumente CACHE_DATOS_MAX_MB."
+                )
+
+            self._entradas[clave] = _Entrada(valor, tamano, coste, expira, fija)
+            self._bytes_actuales += tamano
+            return True
+
+    def segundos_restantes(self, clave: str):
+        """Segundos que le quedan a una entrada vigente, o None si no existe o expiró (sin contar estadísticas)."""
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            restante = entrada.expira - time.monotonic()
+            return restante if restante >= 0 else None
+
+    def prolongar(self, clave: str, timeout: int = None) -> bool:
+        """
+        Renueva la vida de una entrada vigente (`timeout` segundos desde ahora) sin recalcularla.
+        Devuelve False si la entrada ya no existe o expiró.
+        """
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            ahora = time.monotonic()
+            if entrada is None or entrada.expira < ahora:
+                return False
+            entrada.expira = ahora + (self.default_timeout if timeout is None else timeout)
+            return True
+
+    def delete(self, clave: str):
+        """Elimina una entrada si existe."""
+        with self._candado:
+            self._quitar(clave)
+
+    def clear(self):
+        """Vacía el caché (las estadísticas se conservan)."""
+        with self._candado:
+            self._entradas.clear()
+            self._bytes_actuales = 0
+
+    def _quitar(self, clave: str):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes_actuales -= entrada.tamano
+
+    def _liberar_espacio(self, bytes_necesarios: int):
+        """Desaloja entradas hasta que quepan `bytes_necesarios` bytes más."""
+        ahora = time.monotonic()
+        for clave in [c for c, e in self._entradas.items() if e.expira < ahora]:
+            self._quitar(clave)
+            self._estadisticas["entradas_expiradas"] += 1
+
+        while self._bytes_actuales + bytes_necesarios > self.max_bytes:
+            # Entre las menos usadas recientemente (sin contar las fijas), sale la de menor coste por byte.
+            candidatos = []
+            for clave, entrada in self._entradas.items():
+                if entrada.fija:
+                    continue
+                candidatos.append((entrada.coste / max(entrada.tamano, 1), clave))
+                if len(candidatos) == CANDIDATOS_DESALOJO:
+                    break
+            if not candidatos:
+                break
+            _, clave_victima = min(candidatos)
+
+            tamano_victima = self._entradas[clave_victima].tamano
+            self._quitar(clave_victima)
+            self._estadisticas["entradas_desalojadas"] += 1
+            self._estadisticas["bytes_desalojados"] += tamano_victima
+            print(f"Caché de datos: desalojada '{clave_victima}' ({tamano_victima / 1e6:.1f} MB).")
+
+    # --------------------------------------------------------------------------
+    # Memoización
+    # --------------------------------------------------------------------------
+
+    @staticmethod
+    def _clave_funcion(funcion, args: tuple, kwargs: dict) -> str:
+        return f"{funcion.__module__}.{funcion.__qualname__}{args!r}{sorted(kwargs.items())!r}"
+
+    def _tomar_candado_calculo(self, clave: str) -> threading.Lock:
+        with self._candado:
+            registro = self._candados_calculo.setdefault(clave, [threading.Lock(), 0])
+            registro[1] += 1
+            return registro[0]
+
+    def _soltar_candado_calculo(self, clave: str):
+        with self._candado:
+            registro = self._candados_calculo[clave]
+            registro[1] -= 1
+            if registro[1] == 0:
+                del self._candados_calculo[clave]
+
+    def memoize(self, timeout: int = None, fijar_si=None):
+        """
+        Decorador equivalente a `cache.memoize` de Flask-Caching, pero con este caché.
+        También cachea resultados None. Si varios hilos piden a la vez la misma clave,
+        solo uno la calcula y el resto espera su resultado.
+
+        `fijar_si` (callable, opcional) recibe los mismos argumentos que la función y decide si
+        el resultado se guarda como entrada fija (ver `set`).
+        """
+        def decorador(funcion):
+            @wraps(funcion)
+            def envoltura(*args, **kwargs):
+                clave = self._clave_funcion(funcion, args, kwargs)
+                encontrado, valor = self._buscar(clave)
+                if encontrado:
+                    return valor
+
+                candado = self._tomar_candado_calculo(clave)
+                try:
+                    with candado:
+                        # Otro hilo pudo haberla calculado mientras esperábamos el candado.
+                        encontrado, valor = self._buscar(clave, contar=False)
+                        if encontrado:
+                            return valor
+
+                        inicio = time.perf_counter()
+                        valor = funcion(*args, **kwargs)
+                        fija = bool(fijar_si and fijar_si(*args, **kwargs))
+                        self.set(clave, valor, timeout, coste=time.perf_counter() - inicio, fija=fija)
+                        return valor
+                finally:
+                    self._soltar_candado_calculo(clave)
+
+            envoltura.clave_cache = lambda *args, **kwargs: self._clave_funcion(funcion, args, kwargs)
+            return envoltura
+        return decorador
+
+    def esta_en_cache(self, funcion_memoizada, *args, **kwargs) -> bool:
+        """Indica si la llamada ya está cacheada y vigente, sin contar estadísticas ni alterar el orden LRU."""
+        clave = funcion_memoizada.clave_cache(*args, **kwargs)
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            return entrada is not None and entrada.expira >= time.monotonic()
+
+    # --------------------------------------------------------------------------
+    # Estadísticas
+    # --------------------------------------------------------------------------
+
+    def estadisticas(self) -> dict:
+        """Devuelve contadores de uso y el estado actual del presupuesto de memoria."""
+        with self._candado:
+            consultas = self._estadisticas["aciertos"] + self._estadisticas["fallos"]
+            return {
+                **self._estadisticas,
+                "tasa_aciertos": round(self._estadisticas["aciertos"] / consultas, 4) if consultas else 0,
+                "entradas": len(self._entradas),
+                "bytes_actuales": self._bytes_actuales,
+                "max_bytes": self.max_bytes,
+                "entradas_detalle": [
+                    {"clave": clave, "bytes": entrada.tamano, "coste_ms": round(entrada.coste * 1000, 2), "fija": entrada.fija}
+                    for clave, entrada in reversed(self._entradas.items())
+                ],
+            }
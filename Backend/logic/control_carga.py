@@ -0,0 +1,161 @@
+# logic/control_carga.py
+"""
+Control de admisión para los endpoints pesados (Excel, análisis sin caché, exportaciones).
+
+Cada endpoint pesado tiene su propio `LimitadorConcurrencia`: un número máximo de ejecuciones
+simultáneas y una cola acotada. Lo que no cabe en la cola se rechaza al instante (503) en lugar
+de acumular hilos esperando. Por encima de todos ellos, un tope global sin cola mantiene las
+peticiones pesadas por debajo de los hilos del worker, para que siempre queden hilos libres para
+las peticiones baratas (detalle, búsqueda): el hilo de una petición pesada sigue ocupado mientras
+su trabajo corre en el pool dedicado, así que el pool solo limita cuántos trabajos corren a la vez.
+"""
+# --- Importaciones ---
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Reintento mínimo y máximo (segundos) que se sugiere al cliente en la cabecera Retry-After.
+RETRY_AFTER_MINIMO = 1
+RETRY_AFTER_MAXIMO = 120
+
+
+class LimitadorConcurrencia:
+    """
+    Semáforo con cola acotada y espera máxima.
+
+    - Si hay una plaza libre, la petición entra de inmediato.
+    - Si no, espera en cola (hasta `max_en_cola` peticiones) un máximo de `espera_max_s` segundos.
+    - Si la cola está llena o se agota la espera, la petición se rechaza.
+    """
+
+    def __init__(self, nombre: str, max_concurrentes: int, max_en_cola: int, espera_max_s: float):
+        self.nombre = nombre
+        self.max_concurrentes = max_concurrentes
+        self.max_en_cola = max_en_cola
+        self.espera_max_s = espera_max_s
+        self._condicion = threading.Condition()
+        self._activos = 0
+        self._en_cola = 0
+        self._duracion_media_s = 1.0  # Media móvil de la duración de cada ejecución.
+        self._estadisticas = {"admitidas": 0, "encoladas": 0, "rechazadas": 0}
+
+    def entrar(self) -> bool:
+        """Intenta ocupar una plaza. Devuelve False si la petición debe rechazarse."""
+        with self._condicion:
+            if self._activos < self.max_concurrentes:
+                self._activos += 1
+                self._estadisticas["admitidas"] += 1
+                return True
+
+            if self._en_cola >= self.max_en_cola:
+                self._estadisticas["rechazadas"] += 1
+                return False
+
+            self._en_cola += 1
+            self._estadisticas["encoladas"] += 1
+            try:
+                hay_plaza = self._condicion.wait_for(lambda: self._activos < self.max_concurrentes, timeout=self.espera_max_s)
+            finally:
+                self._en_cola -= 1
+
+            if not hay_plaza:
+                self._estadisticas["rechazadas"] += 1
+                return False
+
+            self._activos += 1
+            self._estadisticas["admitidas"] += 1
+            return True
+
+    def salir(self, duracion_s: float):
+        """Libera la plaza y actualiza la duración media usada para estimar el Retry-After."""
+        with self._condicion:
+            self._activos -= 1
+            self._duracion_media_s = 0.8 * self._duracion_media_s + 0.2 * duracion_s
+            self._condicion.notify()
+
+    def segundos_reintento(self) -> int:
+        """Estimación de cuándo habrá plaza: lo que tardan en vaciarse la cola y las ejecuciones en curso."""
+        with self._condicion:
+            rondas = (self._en_cola + 1) / self.max_concurrentes
+            segundos = math.ceil(self._duracion_media_s * rondas)
+        return min(max(segundos, RETRY_AFTER_MINIMO), RETRY_AFTER_MAXIMO)
+
+    def estadisticas(self) -> dict:
+        with self._condicion:
+            return {
+                **self._estadisticas,
+                "activos": self._activos,
+                "en_cola": self._en_cola,
+                "max_concurrentes": self.max_concurrentes,
+                "max_en_cola": self.max_en_cola,
+                "duracion_media_ms": round(self._duracion_media_s * 1000, 2),
+            }
+
+
+def crear_limitadores(limites: dict, espera_max_s: float, hilos_ejecutor: int) -> dict:
+    """
+    Crea un limitador por endpoint a partir de {nombre: (max_concurrentes, max_en_cola)}.
+    Falla al arrancar si un endpoint permite más ejecuciones simultáneas que hilos tiene el pool.
+    """
+    for nombre, (max_concurrentes, _) in limites.items():
+        if max_concurrentes > hilos_ejecutor:
+            raise ValueError(
+                f"'{nombre}' admite {max_concurrentes} ejecuciones simultáneas, pero el pool de trabajos "
+                f"pesados solo tiene {hilos_ejecutor} hilos."
+            )
+    return {
+        nombre: LimitadorConcurrencia(nombre, max_concurrentes, max_en_cola, espera_max_s)
+        for nombre, (max_concurrentes, max_en_cola) in limites.items()
+    }
+
+
+def repartir_hilos_worker(hilos: int, max_conexiones_sse: int, reservados: int) -> dict:
+    """
+    Reparte los hilos que atienden peticiones en un worker entre las suscripciones SSE, las
+    peticiones pesadas y las interactivas, que siempre conservan al menos un hilo libre.
+
+    Si no caben todos los configurados, se reducen primero las conexiones SSE y después los hilos
+    reservados, avisando en consola. Falla al arrancar con menos de 2 hilos, porque entonces una
+    sola petición pesada ocuparía todo el worker.
+
+    Returns:
+        dict: `hilos`, `max_conexiones_sse`, `max_peticiones_pesadas` y `reservados_interactivos`.
+    """
+    if hilos < 2:
+        raise ValueError(
+            f"Con {hilos} hilo(s) por worker no queda ninguno para las peticiones interactivas "
+            f"mientras corre una pesada. Aumente GUNICORN_THREADS."
+        )
+
+    reparto_pedido = (max_conexiones_sse, reservados)
+    reservados = min(reservados, hilos - 1)
+    max_conexiones_sse = min(max_conexiones_sse, hilos - reservados - 1)
+    if (max_conexiones_sse, reservados) != reparto_pedido:
+        print(
+            f"ADVERTENCIA: {hilos} hilos por worker no alcanzan para {reparto_pedido[0]} conexiones SSE, "
+            f"{reparto_pedido[1]} hilos reservados y al menos una petición pesada. Se usan "
+            f"{max_conexiones_sse} conexiones SSE y {reservados} hilos reservados. Aumente GUNICORN_THREADS."
+        )
+
+    return {
+        "hilos": hilos,
+        "max_conexiones_sse": max_conexiones_sse,
+        "max_peticiones_pesadas": hilos - max_conexiones_sse - reservados,
+        "reservados_interactivos": reservados,
+    }
+
+
+def crear_limitador_global(max_peticiones: int) -> LimitadorConcurrencia:
+    """
+    Tope de peticiones pesadas (en ejecución o esperando) de todos los endpoints juntos.
+    No tiene cola: por encima del tope rechaza al instante, sin ocupar el hilo esperando.
+    """
+    return LimitadorConcurrencia("pesados", max_peticiones, 0, 0)
+
+
+def crear_ejecutor_pesado(hilos: int) -> ThreadPoolExecutor:
+    """
+    Pool que ejecuta los trabajos pesados. Limita cuántos corren a la vez entre todos los endpoints;
+    no libera el hilo de la petición, que espera el resultado y por eso cuenta en `repartir_hilos_worker`.
+    """
+    return ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajos-pesados")
@@ -4,36 +4,85 @@ Módulo de Lógica de Negocio (El Cerebro de la Aplicación).
 Optimizado para rendimiento con Caching y Lazy API de Polars.
 """
 # --- Importaciones ---
+import datetime
 import math
+import time
+import uuid
+from collections import Counter
 import polars as pl
-import pandas as pd
 import io
 
+# NOTA: pandas (y con él xlsxwriter) solo se usa para generar los Excel, así que se importa
+# dentro de esas funciones. Así un worker recién arrancado no paga su coste de importación
+# hasta la primera descarga.
+
 # Módulos locales
 from config import settings
-from extensions import cache
+from extensions import cache_datos
 
 # Importar obtener_datos_glosas desde db/mySQL_connector
 # NOTA: Asegúrate de que no haya importaciones circulares. Si `db.mySQL_connector` importa
 # desde `logic.data_processor`, esta estructura podría dar problemas.
-from db.mySQL_connector import obtener_datos_glosas
+from db.mySQL_connector import (
+    obtener_datos_glosas, obtener_glosas_por_docn, obtener_glosas_por_factura, obtener_series_factura, obtener_firma_datos
+)
 
 # ==============================================================================
 # SECCIÓN: OBTENCIÓN Y CACHEO DE DATOS
 # ==============================================================================
 
-@cache.memoize(timeout=600)
+# Tiempo de vida (segundos) de los datos base cacheados y de todo lo que se deriva de ellos.
+TIMEOUT_DATOS_BASE = 600
+
+# Clave de caché con la versión del snapshot completo (histórico sin filtro de fechas).
+# Cambia cada vez que el snapshot se recarga desde la BD, y las estructuras derivadas
+# (índices, series precalculadas...) se memoizan por versión para no mezclar datos.
+# Vive más que el snapshot (se guarda antes de terminar la carga) para que una sola recarga no
+# produzca dos versiones; si el snapshot ya no está, la versión guardada no cuenta.
+CLAVE_VERSION_SNAPSHOT = "data_processor/version_snapshot"
+TIMEOUT_VERSION_SNAPSHOT = 2 * TIMEOUT_DATOS_BASE
+
+# Clave de caché con la firma de la BD (ver `obtener_firma_datos`) tomada al cargar el snapshot completo.
+CLAVE_FIRMA_SNAPSHOT = "data_processor/firma_snapshot"
+
+def _es_snapshot_completo(fecha_inicio: str = None, fecha_fin: str = None) -> bool:
+    return fecha_inicio is None and fecha_fin is None
+
+# El snapshot completo se fija en la caché: si se desalojara por espacio, cada estructura derivada
+# lo recargaría desde la BD con una versión nueva y todo lo memoizado por versión quedaría obsoleto.
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE, fijar_si=_es_snapshot_completo)
 def _obtener_y_limpiar_datos_base_cache(fecha_inicio: str = None, fecha_fin: str = None) -> pl.DataFrame:
     """Función interna y cacheada para obtener y realizar la limpieza inicial de los datos."""
     print(f"¡SIN CACHÉ! Accediendo a la BD para el rango {fecha_inicio} a {fecha_fin}")
     
+    es_completo = fecha_inicio is None and fecha_fin is None
+    if es_completo:
+        # La firma se toma ANTES de leer los datos: un cambio durante la carga se detecta en la próxima revisión.
+        firma, error_firma = obtener_firma_datos()
+        if error_firma:
+            print(f"Advertencia: sin firma de los datos, el snapshot se recargará entero al caducar: {error_firma}")
+
     registros, error = obtener_datos_glosas(fecha_inicio, fecha_fin)
     if error:
         raise Exception(f"Error en capa de datos al obtener glosas: {error}")
+    if es_completo:
+        # Nuevo snapshot completo: nueva versión.
+        cache_datos.set(CLAVE_VERSION_SNAPSHOT, uuid.uuid4().hex, timeout=TIMEOUT_VERSION_SNAPSHOT, fija=True)
+        cache_datos.set(CLAVE_FIRMA_SNAPSHOT, firma, timeout=TIMEOUT_VERSION_SNAPSHOT, fija=True)
     if not registros:
         print("Advertencia: La consulta a la base de datos no devolvió registros.")
         return pl.DataFrame()
 
+    return _limpiar_registros_glosas(registros)
+
+def _limpiar_registros_glosas(registros: list) -> pl.DataFrame:
+    """
+    Convierte las filas de la BD en un DataFrame con los tipos forzados, rellena nulos y
+    deja solo los estatus válidos. La comparten el snapshot y las consultas puntuales.
+    """
+    if not registros:
+        return pl.DataFrame()
+
     schema_forzado = {
         settings.COL_FECHA_NOTIFICACION: pl.Date, 
         settings.COL_FECHA_OBJECION: pl.Date, 
@@ -54,6 +103,249 @@ def _obtener_y_limpiar_datos_base_cache(fecha_inicio: str = None, fecha_fin: str
     
     return df.filter(pl.col(settings.COL_ESTATUS).is_in(settings.VALID_ESTATUS_VALUES))
 
+def _snapshot_completo_en_cache() -> bool:
+    """Indica si el histórico completo ya está en memoria (sin cargarlo si no lo está)."""
+    return cache_datos.esta_en_cache(_obtener_y_limpiar_datos_base_cache, None, None)
+
+def _obtener_version_snapshot() -> str:
+    """
+    Devuelve la versión del snapshot completo, cargándolo si aún no está en caché.
+    Las funciones memoizadas que reciben esta versión como argumento se recalculan
+    automáticamente cuando el snapshot se recarga.
+    """
+    if not _snapshot_completo_en_cache():
+        # Caducó (o nunca se cargó): la recarga guarda una versión nueva.
+        _obtener_y_limpiar_datos_base_cache(None, None)
+    version = cache_datos.get(CLAVE_VERSION_SNAPSHOT)
+    if version is None:
+        # El snapshot seguía en caché pero la versión se perdió: se asigna una nueva.
+        version = uuid.uuid4().hex
+        cache_datos.set(CLAVE_VERSION_SNAPSHOT, version, timeout=TIMEOUT_VERSION_SNAPSHOT, fija=True)
+    return version
+
+def revalidar_snapshot(horizonte_s: float) -> bool:
+    """
+    Si el snapshot completo caducaría en menos de `horizonte_s` segundos y la BD no cambió desde
+    que se cargó (misma firma), renueva su vida con la MISMA versión en lugar de dejar que caduque
+    y se recargue entero. Si la firma cambió o no se conoce, no hace nada: el snapshot caduca y la
+    siguiente lectura lo recarga con una versión nueva.
+
+    Returns:
+        bool: True si se prolongó el snapshot.
+    """
+    clave_snapshot = _obtener_y_limpiar_datos_base_cache.clave_cache(None, None)
+    restante = cache_datos.segundos_restantes(clave_snapshot)
+    firma_cargada = cache_datos.get(CLAVE_FIRMA_SNAPSHOT)
+    if restante is None or restante > horizonte_s or firma_cargada is None:
+        return False
+
+    firma, error = obtener_firma_datos()
+    if error or firma != firma_cargada:
+        return False
+
+    if not cache_datos.prolongar(clave_snapshot, TIMEOUT_DATOS_BASE):
+        return False
+    cache_datos.prolongar(CLAVE_VERSION_SNAPSHOT, TIMEOUT_VERSION_SNAPSHOT)
+    cache_datos.prolongar(CLAVE_FIRMA_SNAPSHOT, TIMEOUT_VERSION_SNAPSHOT)
+    print("Snapshot completo sin cambios en la BD: se prolonga sin recargarlo.")
+    return True
+
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE)
+def _obtener_indice_facturas(version_snapshot: str) -> dict:
+    """
+    Construye, una vez por versión del snapshot, un índice ordenado por `factura_id`
+    (serie + número) para búsquedas por prefijo y por rango.
+
+    No copia los ítems: guarda solo el orden de las filas del snapshot, que se toman de él
+    al responder cada búsqueda.
+
+    Returns:
+        dict: 
+            - "ids": pl.Series ordenada con cada `factura_id` distinto.
+            - "inicios": pl.Series con la posición en "orden" donde empieza cada id
+              (tiene un elemento más que "ids", con el total de filas al final).
+            - "orden": pl.Series con los números de fila del snapshot ordenados por `factura_id`.
+    """
+    print(f"Construyendo índice ordenado de facturas para el snapshot {version_snapshot}")
+    df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+
+    if df_base.is_empty():
+        return {
+            "ids": pl.Series("factura_id", [], dtype=pl.Utf8),
+            "inicios": pl.Series("inicio", [0], dtype=pl.UInt32),
+            "orden": pl.Series("fila", [], dtype=pl.UInt32),
+        }
+
+    factura_ids = _create_factura_id_column(df_base.select(settings.COL_SERIE, settings.COL_N_FACTURA))["factura_id"]
+    orden = factura_ids.arg_sort().alias("fila")
+
+    # Con las filas ordenadas, cada id ocupa un bloque contiguo de "orden": basta guardar dónde empieza.
+    df_bloques = pl.DataFrame({"factura_id": factura_ids.gather(orden)}).with_row_index("inicio").group_by(
+        "factura_id", maintain_order=True
+    ).agg(pl.first("inicio"))
+    inicios = pl.concat([df_bloques["inicio"], pl.Series("inicio", [len(orden)], dtype=pl.UInt32)])
+
+    return {"ids": df_bloques["factura_id"], "inicios": inicios, "orden": orden}
+
+def _obtener_snapshot_con_indice() -> tuple:
+    """
+    Devuelve (snapshot, índice de facturas) de la MISMA versión: si el snapshot se recarga
+    entre ambas lecturas, se vuelve a intentar con la versión nueva.
+    """
+    while True:
+        version = _obtener_version_snapshot()
+        df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+        if cache_datos.get(CLAVE_VERSION_SNAPSHOT) == version:
+            return df_base, _obtener_indice_facturas(version)
+
+# Granularidades de la serie de ingresos: clave de la API -> (etiqueta para el frontend, intervalo de Polars).
+GRANULARIDADES_INGRESOS = {
+    "diario": ("Diario", "1d"),
+    "mensual": ("Mensual", "1mo"),
+    "anual": ("Anual", "1y"),
+}
+
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE)
+def _obtener_series_ingresos(version_snapshot: str) -> dict:
+    """
+    Precalcula, una vez por versión del snapshot, el ingreso de facturas (conteo y saldo)
+    por día, mes y año según la fecha de notificación.
+
+    Cada serie ocupa una fila por período con datos (a lo sumo unos miles de filas para
+    todo el histórico), así que cualquier rango se responde recortándolas.
+
+    Returns:
+        dict: {"diario": df, "mensual": df, "anual": df}, cada uno con las columnas
+              `fecha_agrupada`, `conteo` y `saldo`, ordenado por fecha.
+    """
+    print(f"Precalculando series de ingresos para el snapshot {version_snapshot}")
+    df_diario = _agrupar_ingresos_por_dia(_obtener_y_limpiar_datos_base_cache(None, None))
+
+    series = {"diario": df_diario}
+    for clave in ["mensual", "anual"]:
+        _, intervalo = GRANULARIDADES_INGRESOS[clave]
+        series[clave] = _reagrupar_serie_ingresos(df_diario, intervalo)
+    return series
+
+def _agrupar_ingresos_por_dia(df_items: pl.DataFrame) -> pl.DataFrame:
+    """Ingreso de facturas (conteo y saldo) por día de notificación, con las columnas de las series."""
+    esquema = {"fecha_agrupada": pl.Date, "conteo": pl.UInt32, "saldo": pl.Float64}
+    if df_items.is_empty():
+        return pl.DataFrame(schema=esquema)
+
+    # Una fila por factura (serie, número y gl_docn), igual que en el conteo del dashboard.
+    df_facturas = df_items.unique(subset=settings.GROUP_BY_FACTURA, keep="first").select(
+        pl.col(settings.COL_FECHA_NOTIFICACION).alias("fecha_agrupada"),
+        "saldocartera"
+    ).drop_nulls("fecha_agrupada")
+
+    return df_facturas.group_by("fecha_agrupada").agg(
+        pl.len().alias("conteo"),
+        pl.sum("saldocartera").alias("saldo")
+    ).sort("fecha_agrupada").cast(esquema)
+
+def _reagrupar_serie_ingresos(df_serie: pl.DataFrame, intervalo: str) -> pl.DataFrame:
+    """Agrupa una serie de ingresos a un intervalo más grueso (ej. de días a meses)."""
+    return df_serie.group_by(pl.col("fecha_agrupada").dt.truncate(intervalo)).agg(
+        pl.sum("conteo"),
+        pl.sum("saldo")
+    ).sort("fecha_agrupada")
+
+def _rango_cubre_periodos_completos(inicio: datetime.date, fin: datetime.date, granularidad: str) -> bool:
+    """Indica si [inicio, fin] empieza y termina exactamente en los bordes de los meses/años."""
+    dia_siguiente = fin + datetime.timedelta(days=1)
+    if granularidad == "mensual":
+        return inicio.day == 1 and dia_siguiente.day == 1
+    if granularidad == "anual":
+        return (inicio.month, inicio.day) == (1, 1) and (dia_siguiente.month, dia_siguiente.day) == (1, 1)
+    return True
+
+def obtener_ingresos_por_periodo(fecha_inicio: str = None, fecha_fin: str = None, granularidad: str = None, df_rango: pl.DataFrame = None) -> dict:
+    """
+    Devuelve la serie del gráfico "Ingreso de glosas" para un rango. Si el snapshot completo ya
+    está en memoria, recorta sus series precalculadas en lugar de reagrupar los ítems; si no, agrupa
+    solo los ítems del rango, sin cargar todo el histórico para un gráfico.
+
+    Args:
+        fecha_inicio (str, optional): Inicio del rango 'YYYY-MM-DD'. Sin fechas, todo el histórico.
+        fecha_fin (str, optional): Fin del rango 'YYYY-MM-DD'.
+        granularidad (str, optional): "diario", "mensual" o "anual". Si es None se elige según
+            los días entre la primera y la última notificación del rango, como antes.
+        df_rango (pl.DataFrame, optional): Ítems del rango, si quien llama ya los tiene.
+
+    Returns:
+        dict: `granularidad_ingresos` (etiqueta) e `ingresos_por_periodo` (lista de
+              {fecha_agrupada, conteo, saldo}).
+    """
+    if granularidad is not None and granularidad not in GRANULARIDADES_INGRESOS:
+        raise ValueError(f"Granularidad no válida: {granularidad}")
+
+    if _es_snapshot_completo(fecha_inicio, fecha_fin) or _snapshot_completo_en_cache():
+        series = _obtener_series_ingresos(_obtener_version_snapshot())
+    else:
+        if df_rango is None:
+            df_rango = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
+        series = {"diario": _agrupar_ingresos_por_dia(df_rango)}
+    df_diario = series["diario"]
+
+    inicio = fin = None
+    if fecha_inicio and fecha_fin:
+        inicio = datetime.date.fromisoformat(fecha_inicio)
+        fin = datetime.date.fromisoformat(fecha_fin)
+        df_diario = df_diario.filter(pl.col("fecha_agrupada").is_between(inicio, fin))
+
+    if df_diario.is_empty():
+        etiqueta = GRANULARIDADES_INGRESOS[granularidad][0] if granularidad else "Diario"
+        return {"ingresos_por_periodo": [], "granularidad_ingresos": etiqueta}
+
+    if granularidad is None:
+        dias_rango = (df_diario["fecha_agrupada"].max() - df_diario["fecha_agrupada"].min()).days
+        if dias_rango > 365 * 2:
+            granularidad = "anual"
+        elif dias_rango > 90:
+            granularidad = "mensual"
+        else:
+            granularidad = "diario"
+        print(f"Rango de {dias_rango} días. Granularidad seleccionada: {granularidad}")
+
+    etiqueta, intervalo = GRANULARIDADES_INGRESOS[granularidad]
+
+    if granularidad in series and (inicio is None or _rango_cubre_periodos_completos(inicio, fin, granularidad)):
+        # El rango coincide con períodos completos: basta recortar la serie precalculada.
+        df_serie = series[granularidad]
+        if inicio is not None:
+            df_serie = df_serie.filter(pl.col("fecha_agrupada").is_between(inicio, fin))
+    else:
+        # Meses/años parciales en los bordes (o serie agrupada desde el rango): se reagrupa la diaria ya recortada.
+        df_serie = _reagrupar_serie_ingresos(df_diario, intervalo)
+
+    return {"granularidad_ingresos": etiqueta, "ingresos_por_periodo": df_serie.to_dicts()}
+
+def precalentar_snapshot() -> dict:
+    """
+    Carga el snapshot completo y construye sus estructuras derivadas antes de recibir tráfico,
+    para que la primera petición de un worker ya encuentre todo en caché.
+
+    Returns:
+        dict: Duración en milisegundos de cada fase y número de filas cargadas.
+    """
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+    tiempos["snapshot_ms"] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    _obtener_indice_facturas(_obtener_version_snapshot())
+    tiempos["indice_facturas_ms"] = (time.perf_counter() - inicio) * 1000
+
+    inicio = time.perf_counter()
+    _obtener_series_ingresos(_obtener_version_snapshot())
+    tiempos["series_ingresos_ms"] = (time.perf_counter() - inicio) * 1000
+
+    tiempos["filas"] = df_base.height
+    return tiempos
+
 # ==============================================================================
 # SECCIÓN: CREACIÓN DE TABLAS REUTILIZABLES
 # ==============================================================================
@@ -111,23 +403,12 @@ def crear_tabla_resumen_detalle_polars(df_items: pl.DataFrame) -> pl.DataFrame:
     
     return df_ordenado.select(columnas_finales_deseadas)
 
-# ==============================================================================
-# SECCIÓN: LÓGICA DE ENDPOINTS
-# ==============================================================================
-
-def generar_y_comprobar_todas_las_tablas(fecha_inicio: str = None, fecha_fin: str = None) -> tuple:
+def _clasificar_items_por_factura(df_base: pl.DataFrame) -> pl.DataFrame:
     """
-    Función orquestadora principal para el dashboard, con lógica de conteo unificada
-    y cálculo de datos para la serie de tiempo de ingresos.
+    Añade a cada ítem el `factura_id` (serie-número-gl_docn), los indicadores `es_T1`..`es_T4`
+    y la `CategoriaFactura` resultante (T1, T2, T3, T4 o Mixtas) mediante un plan Lazy.
     """
-    df_base = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
-
-    if df_base.is_empty():
-        return {}, {"error": "No hay datos en el rango de fechas seleccionado."}
-
-    # 1. Ejecutar el plan de clasificación Lazy
-    lazy_df = df_base.lazy()
-    lazy_clasificado = lazy_df.with_columns(
+    lazy_clasificado = df_base.lazy().with_columns(
         pl.concat_str([pl.col(c).cast(pl.Utf8).fill_null("") for c in settings.GROUP_BY_FACTURA], separator="-").alias("factura_id")
     )
     
@@ -140,20 +421,23 @@ def generar_y_comprobar_todas_las_tablas(fecha_inicio: str = None, fecha_fin: st
 
     plan_final = lazy_clasificado.with_columns(
         [(cond.sum().over("factura_id") == pl.count().over("factura_id")).alias(f"es_{tipo}") for tipo, cond in conds.items()]
-    )
-
-    df_final = plan_final.collect()
-
-    # --- INICIO DE LA LÓGICA DE CONTEO UNIFICADA ---
-
-    # 2. Crear la "Fuente de Verdad": una fila por factura con su categoría
-    df_facturas_unicas = df_final.with_columns(
+    ).with_columns(
         pl.when(pl.col("es_T1")).then(pl.lit("T1"))
           .when(pl.col("es_T2")).then(pl.lit("T2"))
           .when(pl.col("es_T3")).then(pl.lit("T3"))
           .when(pl.col("es_T4")).then(pl.lit("T4"))
           .otherwise(pl.lit("Mixtas")).alias("CategoriaFactura")
-    ).select(
+    )
+
+    return plan_final.collect()
+
+# ==============================================================================
+# SECCIÓN: LÓGICA DE ENDPOINTS
+# ==============================================================================
+
+def _obtener_facturas_unicas(df_final: pl.DataFrame) -> pl.DataFrame:
+    """La "Fuente de Verdad" de los conteos: una fila por factura con su categoría."""
+    return df_final.select(
         "factura_id", 
         "saldocartera", 
         "CategoriaFactura", 
@@ -161,10 +445,15 @@ def generar_y_comprobar_todas_las_tablas(fecha_inicio: str = None, fecha_fin: st
         # --- CORRECCIÓN AQUÍ: Añadimos la columna de fecha que necesitamos más tarde ---
         settings.COL_FECHA_NOTIFICACION
     ).unique(subset="factura_id", keep="first")
-    
+
+def _calcular_kpis(df_final: pl.DataFrame, df_facturas_unicas: pl.DataFrame, fecha_inicio: str, fecha_fin: str, granularidad: str = None) -> dict:
+    """
+    Calcula los KPIs del dashboard (conteos, valores, gráficos y comprobación de integridad)
+    a partir de los ítems clasificados y de su tabla de facturas únicas.
+    """
     s_counts = {}
 
-    # 3. Calcular KPIs desde la fuente unificada
+    # Calcular KPIs desde la fuente unificada
     conteo_por_categoria = df_facturas_unicas.group_by("CategoriaFactura").agg(pl.count().alias("conteo"))
     for row in conteo_por_categoria.iter_rows(named=True):
         categoria = row["CategoriaFactura"].lower()
@@ -179,14 +468,14 @@ def generar_y_comprobar_todas_las_tablas(fecha_inicio: str = None, fecha_fin: st
     s_counts["valor_total_no_radicado"] = df_facturas_unicas.filter(pl.col("CategoriaFactura") != "T1")["saldocartera"].sum() or 0
 
     if not df_no_radicadas.is_empty():
-        conteo_entidad_df = df_no_radicadas_unicas.group_by(settings.COL_ENTIDAD).agg(pl.count().alias("total_facturas")).sort("total_facturas", descending=True)
+        conteo_entidad_df = df_no_radicadas_unicas.group_by(settings.COL_ENTIDAD).agg(pl.count().alias("total_facturas")).sort(["total_facturas", settings.COL_ENTIDAD], descending=[True, False])
         s_counts["conteo_por_entidad"] = conteo_entidad_df.limit(15).to_dicts()
         # --- INICIO DE LA NUEVA LÓGICA ---
         # Calculamos el TOP 10 de entidades por saldo en cartera no radicada
         print("Calculando Top 10 de entidades por saldo no radicado...")
         saldo_entidad_df = df_no_radicadas_unicas.group_by(settings.COL_ENTIDAD).agg(
             pl.sum("saldocartera").alias("total_saldo")
-        ).sort("total_saldo", descending=True)
+        ).sort(["total_saldo", settings.COL_ENTIDAD], descending=[True, False])
         
         # Guardamos el Top 10 en el diccionario s_counts
         s_counts["saldo_por_entidad_top10"] = saldo_entidad_df.limit(15).to_dicts()
@@ -197,54 +486,114 @@ def generar_y_comprobar_todas_las_tablas(fecha_inicio: str = None, fecha_fin: st
         s_counts["saldo_por_entidad_top10"] = []    
         s_counts["conteo_por_estatus"] = []
 
-    # 4. DataFrames para exportación
-    dfs = {}
-    for cat in ["T1", "T2", "T3", "T4", "Mixtas"]:
-        ids_cat = df_facturas_unicas.filter(pl.col("CategoriaFactura") == cat).select("factura_id")
-        dfs[cat] = df_final.join(ids_cat, on="factura_id", how="inner")
-
-    # 5. Comprobación de integridad
+    # Comprobación de integridad
     s_counts["total_facturas_base"] = df_facturas_unicas.height
     s_counts["suma_categorizadas"] = sum(v for k, v in s_counts.items() if k.startswith('facturas_'))
     s_counts["comprobacion_exitosa"] = s_counts["total_facturas_base"] == s_counts["suma_categorizadas"]
 
-    # --- LÓGICA PARA GRÁFICO DE INGRESO DE GLOSAS (Ahora funcionará) ---
-    print("Calculando datos para el gráfico de ingresos...")
-    df_ingresos = df_facturas_unicas.select(["factura_id", settings.COL_FECHA_NOTIFICACION]).sort(settings.COL_FECHA_NOTIFICACION)
-    
-    if df_ingresos.is_empty() or df_ingresos[settings.COL_FECHA_NOTIFICACION].is_null().all():
-        s_counts["ingresos_por_periodo"] = []
-        s_counts["granularidad_ingresos"] = "Diario"
-    else:
-        min_date = df_ingresos[settings.COL_FECHA_NOTIFICACION].min()
-        max_date = df_ingresos[settings.COL_FECHA_NOTIFICACION].max()
-        
-        dias_rango = (max_date - min_date).days
-        if dias_rango > 365 * 2:
-            granularidad_txt, granularidad_polars = "Anual", "1y"
-        elif dias_rango > 90:
-            granularidad_txt, granularidad_polars = "Mensual", "1mo"
-        else:
-            granularidad_txt, granularidad_polars = "Diario", "1d"
-            
-        print(f"Rango de {dias_rango} días. Granularidad seleccionada: {granularidad_txt}")
-        df_agrupado = df_ingresos.group_by_dynamic(index_column=settings.COL_FECHA_NOTIFICACION, every=granularidad_polars).agg(pl.count().alias("conteo"))
-        
-        s_counts["granularidad_ingresos"] = granularidad_txt
-        s_counts["ingresos_por_periodo"] = df_agrupado.rename({settings.COL_FECHA_NOTIFICACION: "fecha_agrupada"}).to_dicts()
+    # --- LÓGICA PARA GRÁFICO DE INGRESO DE GLOSAS ---
+    # Con el snapshot en memoria se recortan sus series precalculadas; si no, se agrupan estos ítems.
+    s_counts.update(obtener_ingresos_por_periodo(fecha_inicio, fecha_fin, granularidad, df_rango=df_final))
 
-    dfs["df_base"] = df_final
-    return dfs, s_counts
+    return s_counts
 
-def obtener_resumenes_paginados(fecha_inicio: str, fecha_fin: str, categorias: list, pagina: int, por_pagina: int, entidad: str = None) -> dict:
-    """Obtiene resúmenes de facturas, filtra y pagina. Versión corregida."""
-    print(f"Obteniendo Resúmenes: Categorías={categorias}, Página={pagina}, Entidad={entidad}")
+def calcular_kpis_dashboard(fecha_inicio: str = None, fecha_fin: str = None, granularidad: str = None) -> dict:
+    """
+    Función orquestadora principal para el dashboard, con lógica de conteo unificada
+    y cálculo de datos para la serie de tiempo de ingresos.
+    `granularidad` ("diario", "mensual" o "anual") fuerza la de la serie; si es None se elige por el rango.
 
+    Solo calcula los KPIs: las tablas por categoría del Excel se generan aparte, y solo al
+    descargarlo, con `obtener_tablas_exportacion`.
+    """
     df_base = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
 
     if df_base.is_empty():
-        return {"data": [], "pagina_actual": 1, "total_paginas": 0, "total_registros": 0}
-        
+        return {"error": "No hay datos en el rango de fechas seleccionado."}
+
+    # 1. Clasificar cada ítem según la categoría de su factura
+    df_final = _clasificar_items_por_factura(df_base)
+
+    # 2. Crear la "Fuente de Verdad": una fila por factura con su categoría
+    df_facturas_unicas = _obtener_facturas_unicas(df_final)
+
+    # 3. Calcular KPIs desde la fuente unificada
+    return _calcular_kpis(df_final, df_facturas_unicas, fecha_inicio, fecha_fin, granularidad)
+
+def obtener_tablas_exportacion(fecha_inicio: str = None, fecha_fin: str = None):
+    """
+    Prepara las tablas del Excel por rango con los mismos datos y la misma clasificación que el dashboard.
+
+    Returns:
+        None si el rango no tiene datos; si no, un generador de (categoria, df_items) en el orden de
+        `NOMBRES_HOJAS_EXCEL`. Cada tabla se crea cuando se pide, así que mientras se escribe el Excel
+        solo existe la de la hoja en curso.
+    """
+    df_base = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
+
+    if df_base.is_empty():
+        return None
+
+    return _iterar_tablas_exportacion(df_base)
+
+def _iterar_tablas_exportacion(df_base: pl.DataFrame):
+    df_final = _clasificar_items_por_factura(df_base)
+    # Todos los ítems de una factura comparten su `CategoriaFactura`, así que filtrar por ella
+    # equivale a unir con las facturas de la categoría.
+    for categoria in NOMBRES_HOJAS_EXCEL:
+        yield categoria, df_final.filter(pl.col("CategoriaFactura") == categoria)
+
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE)
+def _calcular_kpis_snapshot(version_snapshot: str, fecha_inicio: str, fecha_fin: str, granularidad: str) -> dict:
+    """
+    KPIs de un rango calculados sobre el snapshot completo de `version_snapshot`, sin consultar
+    la BD por rango. Se memoiza por versión: se calcula una sola vez por rango y por recarga de datos.
+    """
+    print(f"Calculando KPIs del rango {fecha_inicio} a {fecha_fin} para el snapshot {version_snapshot}")
+    df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+
+    if not df_base.is_empty() and fecha_inicio and fecha_fin:
+        inicio = datetime.date.fromisoformat(fecha_inicio)
+        fin = datetime.date.fromisoformat(fecha_fin)
+        df_base = df_base.filter(pl.col(settings.COL_FECHA_NOTIFICACION).is_between(inicio, fin))
+
+    if df_base.is_empty():
+        return {"error": "No hay datos en el rango de fechas seleccionado."}
+
+    df_final = _clasificar_items_por_factura(df_base)
+    return _calcular_kpis(df_final, _obtener_facturas_unicas(df_final), fecha_inicio, fecha_fin, granularidad)
+
+def obtener_kpis_version_actual(fecha_inicio: str = None, fecha_fin: str = None, granularidad: str = None) -> tuple:
+    """
+    Devuelve (version_snapshot, kpis) con los datos más recientes. Si el snapshot caducó, se recarga
+    aquí desde la BD y la versión cambia: así es como se detecta que hay datos nuevos que notificar.
+    """
+    version = _obtener_version_snapshot()
+    return version, _calcular_kpis_snapshot(version, fecha_inicio, fecha_fin, granularidad)
+
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE)
+def _obtener_vistas_resumenes(fecha_inicio: str, fecha_fin: str) -> dict:
+    """
+    Construye una vez por rango las vistas de resúmenes de factura que usa la paginación.
+
+    Además de la tabla completa, guarda las filas de la tabla agrupadas por entidad (en el mismo
+    orden) y los totales precalculados (facturas y saldo) por categoría y por entidad+categoría.
+    Así, el drill-down de una entidad se responde solo con sus filas, sin recorrer todo el rango
+    y sin guardar una segunda copia de la tabla.
+
+    Returns:
+        dict | None: None si el rango no tiene datos; si no:
+            - "todas": pl.DataFrame con todos los resúmenes y su `CategoriaFactura`.
+            - "totales": {categoria: (total_facturas, saldo)}.
+            - "filas_por_entidad": pl.Series con los números de fila de "todas" ordenados por entidad.
+            - "bloques_por_entidad": {entidad: (inicio, largo)} de cada entidad en "filas_por_entidad".
+            - "totales_por_entidad": {entidad: {categoria: (total_facturas, saldo)}}.
+    """
+    df_base = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
+
+    if df_base.is_empty():
+        return None
+
     df_resumen_completo = crear_tabla_resumen_detalle_polars(df_base)
 
     df_resumenes = df_resumen_completo.filter(pl.col("TipoFila") == "Resumen Factura")
@@ -256,51 +605,136 @@ def obtener_resumenes_paginados(fecha_inicio: str, fecha_fin: str, categorias: l
           .when(pl.col("Items_SinCC_ConFR") == pl.col("Total_Items_Factura")).then(pl.lit("T4"))
           .otherwise(pl.lit("Mixtas")).alias("CategoriaFactura")
     )
-    
-    df_resumenes_filtrados = df_resumenes_con_categoria
-    
-    if categorias:
-        df_resumenes_filtrados = df_resumenes_filtrados.filter(pl.col("CategoriaFactura").is_in(categorias))
 
+    # El saldo de cada factura está en 'vr_glosa' para las filas de resumen (ver `crear_tabla_resumen...`).
+    df_totales = df_resumenes_con_categoria.group_by([settings.COL_ENTIDAD, "CategoriaFactura"]).agg(
+        pl.len().alias("total_facturas"),
+        pl.sum(settings.COL_VR_GLOSA).alias("saldo")
+    )
+
+    totales = {}
+    totales_por_entidad = {}
+    for fila in df_totales.iter_rows(named=True):
+        categoria = fila["CategoriaFactura"]
+        conteo_previo, saldo_previo = totales.get(categoria, (0, 0))
+        totales[categoria] = (conteo_previo + fila["total_facturas"], saldo_previo + fila["saldo"])
+        totales_por_entidad.setdefault(fila[settings.COL_ENTIDAD], {})[categoria] = (fila["total_facturas"], fila["saldo"])
+
+    # Con `maintain_order` el orden es estable: dentro de cada entidad las filas siguen en el orden de "todas".
+    df_filas = df_resumenes_con_categoria.select(settings.COL_ENTIDAD).with_row_index("fila").sort(
+        settings.COL_ENTIDAD, maintain_order=True
+    )
+    df_bloques = df_filas.with_row_index("inicio").group_by(settings.COL_ENTIDAD, maintain_order=True).agg(
+        pl.first("inicio"),
+        pl.len().alias("largo")
+    )
+
+    return {
+        "todas": df_resumenes_con_categoria,
+        "totales": totales,
+        "filas_por_entidad": df_filas["fila"],
+        "bloques_por_entidad": {fila[settings.COL_ENTIDAD]: (fila["inicio"], fila["largo"]) for fila in df_bloques.iter_rows(named=True)},
+        "totales_por_entidad": totales_por_entidad,
+    }
+
+def obtener_pagina_resumenes(fecha_inicio: str, fecha_fin: str, categorias: list, pagina: int, por_pagina: int, entidad: str = None) -> tuple:
+    """
+    Obtiene resúmenes de facturas, filtra y pagina, sin convertir a JSON.
+
+    Returns:
+        tuple: (df_pagina, metadatos). `df_pagina` conserva los tipos de Polars (fechas incluidas)
+               y `metadatos` contiene `pagina_actual`, `total_paginas`, `total_registros`
+               y `saldo_total_acumulado`.
+    """
+    print(f"Obteniendo Resúmenes: Categorías={categorias}, Página={pagina}, Entidad={entidad}")
+
+    vistas = _obtener_vistas_resumenes(fecha_inicio, fecha_fin)
+
+    if vistas is None:
+        return pl.DataFrame(), {"pagina_actual": 1, "total_paginas": 0, "total_registros": 0, "saldo_total_acumulado": 0}
+
+    df_todas = vistas["todas"]
+
+    # Con entidad, todo se resuelve sobre los números de fila de esa entidad; sin ella, sobre la tabla completa.
+    filas = None
     if entidad:
-        df_resumenes_filtrados = df_resumenes_filtrados.filter(pl.col(settings.COL_ENTIDAD) == entidad)
-        
-    # --- INICIO DE LA NUEVA LÓGICA ---
-    
-    # Calculamos el saldo total ANTES de paginar
-    # Usamos la columna correcta que contiene el saldo ('saldocartera' o 'vr_glosa' en el resumen)
-    # Basado en tu función `crear_tabla_resumen...`, el saldo está en 'vr_glosa' para los resúmenes.
-    saldo_total_acumulado = df_resumenes_filtrados[settings.COL_VR_GLOSA].sum() or 0
+        if entidad not in vistas["bloques_por_entidad"]:
+            return df_todas.clear(), {"pagina_actual": pagina, "total_paginas": 0, "total_registros": 0, "saldo_total_acumulado": 0}
+        inicio, largo = vistas["bloques_por_entidad"][entidad]
+        filas = vistas["filas_por_entidad"].slice(inicio, largo)
+        totales = vistas["totales_por_entidad"][entidad]
+    else:
+        totales = vistas["totales"]
+
+    categorias_seleccionadas = [c for c in totales if not categorias or c in categorias]
+
+    # Totales y saldo ANTES de paginar, leídos de los precalculados por categoría.
+    total_registros = sum(totales[c][0] for c in categorias_seleccionadas)
+    saldo_total_acumulado = sum(totales[c][1] for c in categorias_seleccionadas) or 0
     print(f"Saldo acumulado para esta sección: {saldo_total_acumulado}")
-    
-    # --- FIN DE LA NUEVA LÓGICA ---
-        
-    total_registros = len(df_resumenes_filtrados)
+
     if total_registros == 0:
-        return {"data": [], "pagina_actual": pagina, "total_paginas": 0, "total_registros": 0}
-    
+        return df_todas.clear(), {"pagina_actual": pagina, "total_paginas": 0, "total_registros": 0, "saldo_total_acumulado": 0}
+
+    filtrar_categorias = len(categorias_seleccionadas) < len(totales)
     total_paginas = math.ceil(total_registros / por_pagina)
     offset = (pagina - 1) * por_pagina
-    df_pagina = df_resumenes_filtrados.slice(offset, por_pagina)
-    
-    datos_dict = df_pagina.with_columns(
-        pl.col(pl.Date).dt.strftime("%Y-%m-%d")
-    ).fill_null("").to_dicts()
 
-    return {
-        "data": datos_dict, 
+    if filas is None:
+        df_resumenes_filtrados = df_todas
+        if filtrar_categorias:
+            df_resumenes_filtrados = df_todas.filter(pl.col("CategoriaFactura").is_in(categorias_seleccionadas))
+        df_pagina = df_resumenes_filtrados.slice(offset, por_pagina)
+    else:
+        if filtrar_categorias:
+            filas = filas.filter(df_todas["CategoriaFactura"].gather(filas).is_in(categorias_seleccionadas))
+        # Solo se copian las filas de la página.
+        df_pagina = df_todas[filas.slice(offset, por_pagina)]
+
+    return df_pagina, {
         "pagina_actual": pagina, 
         "total_paginas": total_paginas, 
         "total_registros": total_registros,
         "saldo_total_acumulado": saldo_total_acumulado
         }
 
+def obtener_resumenes_paginados(fecha_inicio: str, fecha_fin: str, categorias: list, pagina: int, por_pagina: int, entidad: str = None) -> dict:
+    """Obtiene resúmenes de facturas, filtra y pagina. Versión corregida."""
+    df_pagina, metadatos = obtener_pagina_resumenes(fecha_inicio, fecha_fin, categorias, pagina, por_pagina, entidad)
+
+    if metadatos["total_registros"] == 0:
+        return {"data": [], "pagina_actual": metadatos["pagina_actual"], "total_paginas": 0, "total_registros": 0}
+    
+    datos_dict = df_pagina.with_columns(
+        pl.col(pl.Date).dt.strftime("%Y-%m-%d")
+    ).fill_null("").to_dicts()
+
+    return {"data": datos_dict, **metadatos}
+
+def obtener_snapshot_rango(fecha_inicio: str = None, fecha_fin: str = None) -> pl.DataFrame:
+    """
+    Devuelve todos los ítems limpios del rango con su `factura_id` y `CategoriaFactura`.
+    Pensado para exportaciones masivas (Parquet/Arrow) hacia herramientas de BI.
+    """
+    df_base = _obtener_y_limpiar_datos_base_cache(fecha_inicio, fecha_fin)
+
+    if df_base.is_empty():
+        return df_base
+
+    return _clasificar_items_por_factura(df_base).drop([f"es_{tipo}" for tipo in ["T1", "T2", "T3", "T4"]])
+
 def obtener_detalle_especifico_factura(docn: int) -> list:
     """Obtiene los ítems de detalle para un único gl_docn."""
     print(f"Obteniendo detalle para gl_docn: {docn}")
-    df_base_completa = _obtener_y_limpiar_datos_base_cache(None, None)
-    
-    df_items_factura = df_base_completa.filter(pl.col(settings.COL_GL_DOCN) == docn)
+    if _snapshot_completo_en_cache():
+        df_base_completa = _obtener_y_limpiar_datos_base_cache(None, None)
+        df_items_factura = df_base_completa.filter(pl.col(settings.COL_GL_DOCN) == docn) if not df_base_completa.is_empty() else df_base_completa
+    else:
+        # Sin snapshot en memoria, un clic en un detalle no debe traer todo el histórico.
+        registros, error = obtener_glosas_por_docn([docn])
+        if error:
+            raise Exception(f"Error en capa de datos al obtener el detalle: {error}")
+        df_items_factura = _limpiar_registros_glosas(registros)
     
     if df_items_factura.is_empty():
         return []
@@ -319,76 +753,283 @@ def _create_factura_id_column(df: pl.DataFrame) -> pl.DataFrame:
     )
 
 
-def buscar_facturas_completas(lista_ids_factura_str: list) -> dict:
-    """Busca facturas por una lista de formatos completos y preserva los duplicados de la entrada."""
-    df_base = _obtener_y_limpiar_datos_base_cache(None, None)
-    
-    if df_base.is_empty():
-        return {"encontrados": [], "no_encontrados": lista_ids_factura_str, "saldo_total_acumulado": 0}
+def _limpiar_ids_busqueda(lista_ids_factura_str: list) -> list:
+    """Normaliza la entrada del usuario: quita espacios y descarta líneas vacías, preservando orden y duplicados."""
+    return [str(item).strip() for item in lista_ids_factura_str if str(item).strip()]
 
-    df_base_con_factura_id = _create_factura_id_column(df_base)
-    
-    # Limpiamos la entrada del usuario
-    ids_busqueda_limpios = [str(item).strip() for item in lista_ids_factura_str if str(item).strip()]
-    ids_busqueda_unicos = list(set(ids_busqueda_limpios))
 
-    # Buscamos solo los IDs únicos para ser eficientes
-    df_encontrados_unicos = df_base_con_factura_id.filter(
-        pl.col("factura_id").is_in(ids_busqueda_unicos)
-    )
-    
-    if df_encontrados_unicos.is_empty():
-        return {"encontrados": [], "no_encontrados": ids_busqueda_limpios, "saldo_total_acumulado": 0}
-
-    # --- Lógica para Replicar Duplicados ---
-    # Convertimos los resultados únicos a un diccionario para fácil acceso
-    resultados_dict = {
-        row["factura_id"]: df_encontrados_unicos.filter(pl.col("factura_id") == row["factura_id"])
-        for row in df_encontrados_unicos.select("factura_id").unique().iter_rows(named=True)
-    }
+@cache_datos.memoize(timeout=TIMEOUT_DATOS_BASE)
+def _obtener_series_factura() -> list:
+    """Series de factura que existen en la BD. Una serie nueva se reconoce al caducar esta entrada."""
+    series, error = obtener_series_factura()
+    if error:
+        raise Exception(f"Error en capa de datos al obtener las series de factura: {error}")
+    return series
+
+
+def _separar_serie_y_numero(factura_id: str, series: list) -> list:
+    """
+    Devuelve los pares (serie, número) posibles para un `factura_id`: uno por cada serie existente
+    con la que empieza el id y tras la que solo quedan dígitos. Casi siempre es uno solo; solo hay
+    más si una serie es prefijo de otra (ej. "FE" y "FE2"), y el filtro exacto por `factura_id`
+    descarta los sobrantes.
+    El número se devuelve como entero, igual que lo compara la BD: así "FE2" + "0100001" y
+    "FE2" + "100001" son el mismo par y se pueden deduplicar antes de consultar.
+    """
+    candidatos = []
+    for serie in series:
+        numero = factura_id[len(serie):]
+        if factura_id.startswith(serie) and numero.isascii() and numero.isdigit():
+            candidatos.append((serie, int(numero)))
+    return candidatos
+
+
+def _buscar_en_snapshot(ids_factura: list) -> bool:
+    """
+    Indica si una búsqueda debe filtrar el snapshot completo en lugar de consultar sus facturas
+    a la BD: cuando ya está en memoria, o cuando son tantas facturas que cargarlo sale más barato.
+    """
+    return _snapshot_completo_en_cache() or len(set(ids_factura)) > settings.CONSULTA_PUNTUAL_MAX_FACTURAS
+
+
+def _consultar_items_por_factura_ids(ids_factura: list) -> pl.DataFrame:
+    """
+    Trae de la BD solo los ítems de las facturas indicadas, limpios y con su `factura_id`.
+    Es la alternativa a filtrar el snapshot completo cuando este no está en caché.
+    """
+    # Ids distintos pueden generar el mismo par normalizado: si cayeran en lotes `IN` distintos,
+    # la BD devolvería sus filas dos veces.
+    series = _obtener_series_factura()
+    pares = list(dict.fromkeys(
+        par for factura_id in dict.fromkeys(ids_factura) for par in _separar_serie_y_numero(factura_id, series)
+    ))
+    registros, error = obtener_glosas_por_factura(pares)
+    if error:
+        raise Exception(f"Error en capa de datos al buscar facturas: {error}")
+
+    df_items = _limpiar_registros_glosas(registros)
+    if df_items.is_empty():
+        return df_items
+    return _create_factura_id_column(df_items)
+
+
+def _buscar_items_por_ids(df_base_con_factura_id: pl.DataFrame, ids_busqueda: list) -> tuple:
+    """
+    Busca los ítems de un conjunto de IDs de factura ya limpios.
+
+    Un ID repetido en la entrada replica sus ítems tantas veces como aparece,
+    igual que siempre ha hecho la búsqueda.
+
+    Returns:
+        tuple: (df_items, ids_encontrados_set).
+    """
+    df_ids = pl.DataFrame({"factura_id": ids_busqueda}, schema={"factura_id": pl.Utf8})
+
+    # El join contra la lista de entrada (con duplicados) replica las filas de forma vectorizada.
+    df_items = df_base_con_factura_id.join(df_ids, on="factura_id", how="inner")
+    ids_encontrados_set = set(df_items["factura_id"].unique().to_list())
+
+    return df_items, ids_encontrados_set
 
-    # Construimos el DataFrame final respetando el orden y duplicados de la entrada
-    resultados_finales_list = []
-    ids_encontrados_set = set()
-    for fact_id in ids_busqueda_limpios:
-        if fact_id in resultados_dict:
-            resultados_finales_list.append(resultados_dict[fact_id])
-            ids_encontrados_set.add(fact_id)
 
-    df_encontrados_items = pl.concat(resultados_finales_list) if resultados_finales_list else pl.DataFrame()
+def buscar_facturas_completas_tabla(lista_ids_factura_str: list) -> dict:
+    """
+    Igual que `buscar_facturas_completas`, pero `encontrados` se devuelve como un
+    DataFrame de Polars para los consumidores que no necesitan JSON (Excel, Arrow, Parquet).
+    """
+    # Limpiamos la entrada del usuario
+    ids_busqueda_limpios = _limpiar_ids_busqueda(lista_ids_factura_str)
+
+    if _buscar_en_snapshot(ids_busqueda_limpios):
+        df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+        if df_base.is_empty():
+            return {"encontrados": pl.DataFrame(), "no_encontrados": lista_ids_factura_str, "saldo_total_acumulado": 0}
+        df_base_con_factura_id = _create_factura_id_column(df_base)
+    else:
+        df_base_con_factura_id = _consultar_items_por_factura_ids(ids_busqueda_limpios)
+        if df_base_con_factura_id.is_empty():
+            return {"encontrados": pl.DataFrame(), "no_encontrados": ids_busqueda_limpios, "saldo_total_acumulado": 0}
+
+    df_encontrados_items, ids_encontrados_set = _buscar_items_por_ids(df_base_con_factura_id, ids_busqueda_limpios)
+    
+    if df_encontrados_items.is_empty():
+        return {"encontrados": pl.DataFrame(), "no_encontrados": ids_busqueda_limpios, "saldo_total_acumulado": 0}
 
     df_tabla_final = crear_tabla_resumen_detalle_polars(df_encontrados_items)
     
-    # No encontrados son los que no estaban en el diccionario de resultados
+    # No encontrados son los que no aparecieron en la base
     no_encontrados = [fact_id for fact_id in ids_busqueda_limpios if fact_id not in ids_encontrados_set]
     
     df_resumenes = df_tabla_final.filter(pl.col("TipoFila") == "Resumen Factura")
     saldo_acumulado = df_resumenes[settings.COL_VR_GLOSA].sum() or 0
     
     return {
-        "encontrados": df_tabla_final.to_dicts(),
+        "encontrados": df_tabla_final,
         "no_encontrados": no_encontrados,
         "saldo_total_acumulado": saldo_acumulado
     }
 
-def generar_excel_en_memoria(dataframes: dict) -> io.BytesIO:
+
+def buscar_facturas_completas(lista_ids_factura_str: list) -> dict:
+    """Busca facturas por una lista de formatos completos y preserva los duplicados de la entrada."""
+    resultados = buscar_facturas_completas_tabla(lista_ids_factura_str)
+    return {**resultados, "encontrados": resultados["encontrados"].to_dicts()}
+
+
+def buscar_facturas_completas_por_lotes(lista_ids_factura_str: list, tamano_lote: int = settings.BUSQUEDA_STREAM_TAMANO_LOTE):
+    """
+    Variante en streaming de `buscar_facturas_completas`.
+
+    En lugar de construir la lista completa de `encontrados`, procesa la entrada en
+    lotes de `tamano_lote` IDs distintos y genera eventos a medida que avanza, de modo que la
+    memoria del servidor depende del tamaño del lote y no del total de resultados.
+    Si el snapshot completo no está en caché, cada lote se consulta directamente a la BD.
+
+    Yields:
+        tuple: Eventos `(tipo, valor)` en este orden:
+            - ("esquema", pl.DataFrame vacío) con las columnas y tipos de la tabla final,
+              tomados del primer lote con resultados (sin columnas si no hubo ninguno).
+            - ("encontrados", pl.DataFrame) una vez por cada lote con resultados.
+            - ("resumen", dict) al final, con `no_encontrados` y `saldo_total_acumulado`.
+    """
+    ids_busqueda_limpios = _limpiar_ids_busqueda(lista_ids_factura_str)
+
+    if _buscar_en_snapshot(ids_busqueda_limpios):
+        df_base = _obtener_y_limpiar_datos_base_cache(None, None)
+
+        if df_base.is_empty():
+            yield "esquema", pl.DataFrame()
+            yield "resumen", {"no_encontrados": lista_ids_factura_str, "saldo_total_acumulado": 0}
+            return
+
+        df_base_con_factura_id = _create_factura_id_column(df_base)
+    else:
+        # Sin snapshot en memoria, cada lote consulta a la BD solo sus propias facturas.
+        df_base_con_factura_id = None
+
+    ids_encontrados_set = set()
+    saldo_acumulado = 0
+    df_esquema = None
+
+    # Los lotes se forman con IDs distintos, y cada ID lleva todas sus repeticiones de la entrada:
+    # así ninguna factura se emite (ni se suma al saldo) en dos lotes, y los duplicados se replican
+    # igual que en `buscar_facturas_completas`.
+    repeticiones = Counter(ids_busqueda_limpios)
+    ids_distintos = list(repeticiones)
+
+    for inicio in range(0, len(ids_distintos), tamano_lote):
+        ids_lote = [
+            factura_id for factura_id in ids_distintos[inicio:inicio + tamano_lote]
+            for _ in range(repeticiones[factura_id])
+        ]
+        df_candidatos = df_base_con_factura_id if df_base_con_factura_id is not None else _consultar_items_por_factura_ids(ids_lote)
+        if df_candidatos.is_empty():
+            continue
+
+        df_items_lote, encontrados_lote = _buscar_items_por_ids(df_candidatos, ids_lote)
+        if df_items_lote.is_empty():
+            continue
+
+        if df_esquema is None:
+            # El esquema se fija con el primer lote para que todos los lotes compartan tipos.
+            df_esquema = crear_tabla_resumen_detalle_polars(df_items_lote.head(1)).clear()
+            yield "esquema", df_esquema
+
+        ids_encontrados_set |= encontrados_lote
+        df_tabla_lote = crear_tabla_resumen_detalle_polars(df_items_lote).cast(df_esquema.schema)
+        saldo_acumulado += df_tabla_lote.filter(pl.col("TipoFila") == "Resumen Factura")[settings.COL_VR_GLOSA].sum() or 0
+
+        yield "encontrados", df_tabla_lote
+
+    if df_esquema is None:
+        yield "esquema", pl.DataFrame()
+
+    no_encontrados = [fact_id for fact_id in ids_busqueda_limpios if fact_id not in ids_encontrados_set]
+    yield "resumen", {"no_encontrados": no_encontrados, "saldo_total_acumulado": saldo_acumulado}
+
+def buscar_facturas_parcial(prefijo: str = None, desde: str = None, hasta: str = None, limite: int = settings.BUSQUEDA_PARCIAL_LIMITE) -> dict:
+    """
+    Busca facturas por prefijo o por rango de `factura_id` (serie + número) usando el
+    índice ordenado del snapshot: dos búsquedas binarias y un corte contiguo, es decir
+    O(log n + k) sin recorrer toda la tabla.
+
+    El orden es lexicográfico (texto), como en un listado de Excel: "FCR100" va antes que "FCR99".
+
+    Args:
+        prefijo (str, optional): Inicio del `factura_id` (ej. "FCR" o "FCR1234").
+        desde (str, optional): Límite inferior inclusivo del rango (se ignora si hay prefijo).
+        hasta (str, optional): Límite superior inclusivo del rango (se ignora si hay prefijo).
+        limite (int): Máximo de facturas distintas a devolver.
+
+    Returns:
+        dict: `encontrados` (tabla resumen/detalle), `facturas` (ids devueltos),
+              `total_coincidencias`, `truncado` y `saldo_total_acumulado`.
+    """
+    df_base, indice = _obtener_snapshot_con_indice()
+    ids = indice["ids"]
+
+    if prefijo is not None:
+        # Todo id que empieza por el prefijo queda entre el prefijo y el prefijo seguido del mayor carácter posible.
+        posicion_inicio = ids.search_sorted(prefijo, side="left")
+        posicion_fin = ids.search_sorted(prefijo + "\U0010ffff", side="left")
+    else:
+        posicion_inicio = ids.search_sorted(desde, side="left") if desde else 0
+        posicion_fin = ids.search_sorted(hasta, side="right") if hasta else len(ids)
+
+    total_coincidencias = max(posicion_fin - posicion_inicio, 0)
+    posicion_corte = posicion_inicio + min(total_coincidencias, limite)
+
+    if total_coincidencias == 0:
+        return {"encontrados": [], "facturas": [], "total_coincidencias": 0, "truncado": False, "saldo_total_acumulado": 0}
+
+    fila_inicio = indice["inicios"][posicion_inicio]
+    fila_fin = indice["inicios"][posicion_corte]
+    filas = indice["orden"].slice(fila_inicio, fila_fin - fila_inicio)
+    df_items = _create_factura_id_column(df_base[filas])
+
+    df_tabla_final = crear_tabla_resumen_detalle_polars(df_items)
+    saldo_acumulado = df_tabla_final.filter(pl.col("TipoFila") == "Resumen Factura")[settings.COL_VR_GLOSA].sum() or 0
+
+    return {
+        "encontrados": df_tabla_final.to_dicts(),
+        "facturas": ids.slice(posicion_inicio, posicion_corte - posicion_inicio).to_list(),
+        "total_coincidencias": total_coincidencias,
+        "truncado": total_coincidencias > limite,
+        "saldo_total_acumulado": saldo_acumulado
+    }
+
+# Hojas del reporte Excel por rango, en orden: categoría -> nombre de la hoja.
+NOMBRES_HOJAS_EXCEL = {"T1": "Radicadas", "T2": "Con CC y Sin FR", "T3": "Sin CC y Sin FR", "T4": "Sin CC y Con FR", "Mixtas": "Mixtas"}
+NOMBRE_HOJA_BUSQUEDA = "Resultado Búsqueda"
+
+def generar_excel_en_memoria(tablas, notificar_progreso=None) -> io.BytesIO:
     """
     Genera el archivo Excel a partir de los DataFrames categorizados,
     eliminando la parte de la hora de las fechas a nivel de datos.
+
+    Args:
+        tablas (iterable): Pares (categoria, df_items), como los que produce `obtener_tablas_exportacion`.
+            Se consumen de uno en uno: cada tabla puede liberarse en cuanto su hoja está escrita.
+        notificar_progreso (callable, optional): Se llama con (nombre_hoja, estado) al empezar
+            ('procesando') y al terminar ('completada' u 'omitida') cada hoja.
     """
+    import pandas as pd
+
     buffer = io.BytesIO()
-    nombres_hojas = {"T1": "Radicadas", "T2": "Con CC y Sin FR", "T3": "Sin CC y Sin FR", "T4": "Sin CC y Con FR", "Mixtas": "Mixtas"}
+    nombres_hojas = NOMBRES_HOJAS_EXCEL
+    notificar = notificar_progreso or (lambda hoja, estado: None)
     
     with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
         workbook = writer.book
         # Este formato ahora servirá como un extra, pero la clave es el cambio en los datos.
         formato_fecha = workbook.add_format({'num_format': 'dd/mm/yyyy'})
         
-        sheets_to_process = {k: v for k, v in dataframes.items() if k in nombres_hojas}
-        
-        for key_df, df_items_polars in sheets_to_process.items():
+        for key_df, df_items_polars in tablas:
+            if key_df not in nombres_hojas:
+                continue
             sheet_name = nombres_hojas.get(key_df, key_df)
             print(f"Procesando hoja '{sheet_name}' para Excel...")
+            notificar(sheet_name, "procesando")
 
             if not df_items_polars.is_empty():
                 df_reporte = crear_tabla_resumen_detalle_polars(df_items_polars)
@@ -425,34 +1066,43 @@ def generar_excel_en_memoria(dataframes: dict) -> io.BytesIO:
                         worksheet.set_column(idx, idx, max_len)
                         
                 print(f"Hoja '{sheet_name}' escrita y formateada.")
+                notificar(sheet_name, "completada")
             else:
                 print(f"Hoja '{sheet_name}' omitida por estar vacía.")
+                notificar(sheet_name, "omitida")
 
     buffer.seek(0)
     return buffer
 
-def generar_excel_busqueda_en_memoria(lista_ids_factura: list) -> io.BytesIO:
+def generar_excel_busqueda_en_memoria(lista_ids_factura: list, notificar_progreso=None) -> io.BytesIO:
     """
     Genera un archivo Excel en memoria para las facturas específicas de una búsqueda.
+    `notificar_progreso` funciona igual que en `generar_excel_en_memoria` (una sola hoja).
     """
+    notificar = notificar_progreso or (lambda hoja, estado: None)
+    notificar(NOMBRE_HOJA_BUSQUEDA, "procesando")
+
     # 1. Obtener los datos completos para los IDs de factura proporcionados.
-    # La función `buscar_facturas_completas` ya nos da la estructura que necesitamos.
-    resultados_busqueda = buscar_facturas_completas(lista_ids_factura)
-    df_encontrados_polars = pl.DataFrame(resultados_busqueda['encontrados'])
+    # La función `buscar_facturas_completas_tabla` ya nos da la estructura que necesitamos.
+    resultados_busqueda = buscar_facturas_completas_tabla(lista_ids_factura)
+    df_encontrados_polars = resultados_busqueda['encontrados']
 
     if df_encontrados_polars.is_empty():
         # Si no se encontró nada, devolvemos un buffer vacío o podríamos lanzar un error.
+        notificar(NOMBRE_HOJA_BUSQUEDA, "omitida")
         return io.BytesIO()
 
     # 2. Preparar el buffer y el ExcelWriter.
+    import pandas as pd
+
     buffer = io.BytesIO()
     with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
         workbook = writer.book
         formato_fecha = workbook.add_format({'num_format': 'dd/mm/yyyy'})
-        sheet_name = "Resultado Búsqueda"
+        sheet_name = NOMBRE_HOJA_BUSQUEDA
 
         # 3. Convertir a Pandas y renombrar columnas.
-        # No necesitamos `crear_tabla_resumen_detalle_polars` porque `buscar_facturas_completas` ya lo hace.
+        # No necesitamos `crear_tabla_resumen_detalle_polars` porque `buscar_facturas_completas_tabla` ya lo hace.
         df_pandas = df_encontrados_polars.to_pandas()
         df_pandas.rename(columns=settings.COLUMN_NAME_MAPPING_EXPORT, inplace=True)
 
@@ -474,6 +1124,7 @@ def generar_excel_busqueda_en_memoria(lista_ids_factura: list) -> io.BytesIO:
                 worksheet.set_column(idx, idx, max_len)
         
         print(f"Hoja '{sheet_name}' para la búsqueda ha sido escrita y formateada.")
+        notificar(sheet_name, "completada")
 
     # 7. Devolver el buffer para ser enviado como archivo.
     buffer.seek(0)
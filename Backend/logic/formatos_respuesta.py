@@ -0,0 +1,151 @@
+# logic/formatos_respuesta.py
+"""
+Serialización de resultados a formatos alternativos al JSON tradicional.
+
+Las funciones de este módulo convierten los eventos generados por la capa de lógica
+(DataFrames de Polars y diccionarios de resumen) en fragmentos listos para ser
+enviados por una respuesta HTTP, ya sea en streaming o como un único cuerpo binario.
+"""
+# --- Importaciones ---
+import io
+import json
+
+from flask import json as flask_json
+
+# NOTA: pyarrow solo se necesita cuando un cliente pide un formato binario,
+# por eso se importa dentro de las funciones que lo usan y no al cargar el módulo.
+
+# --- Tipos MIME soportados ---
+MIMETYPE_JSON = "application/json"
+MIMETYPE_NDJSON = "application/x-ndjson"
+MIMETYPE_ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MIMETYPE_PARQUET = "application/x-parquet"
+
+# Formatos columnares que los endpoints de datos pueden devolver en lugar de JSON,
+# con la extensión usada para el nombre del archivo descargado.
+FORMATOS_BINARIOS = {
+    MIMETYPE_ARROW_STREAM: "arrow",
+    MIMETYPE_PARQUET: "parquet",
+}
+
+
+def generar_ndjson(eventos):
+    """
+    Convierte los eventos de una búsqueda por lotes en líneas NDJSON.
+
+    Cada lote se envía como una línea `{"encontrados": [...]}` y el resumen final
+    como una última línea `{"no_encontrados": [...], "saldo_total_acumulado": ...}`,
+    de modo que al fusionar todas las líneas se obtiene el mismo documento que
+    devuelve el endpoint en modo JSON.
+
+    Args:
+        eventos (iterable): Tuplas `(tipo, valor)` producidas por la capa de lógica.
+
+    Yields:
+        str: Una línea NDJSON terminada en salto de línea.
+    """
+    try:
+        for tipo, valor in eventos:
+            if tipo == "encontrados":
+                # Se usa el serializador de Flask para que las fechas salgan igual que en `jsonify`.
+                yield flask_json.dumps({"encontrados": valor.to_dicts()}) + "\n"
+            elif tipo == "resumen":
+                yield flask_json.dumps(valor) + "\n"
+    except Exception as e:
+        # Las cabeceras ya se enviaron, así que el error viaja como una última línea.
+        print(f"Error durante el streaming NDJSON: {e}")
+        yield flask_json.dumps({"error": str(e)}) + "\n"
+
+
+def generar_arrow_ipc(eventos):
+    """
+    Convierte los eventos de una búsqueda por lotes en un stream Arrow IPC.
+
+    El primer evento ("esquema") fija el esquema del stream; cada lote se escribe como
+    uno o más record batches. El resumen final se envía como un record batch vacío
+    cuyo `custom_metadata` contiene `no_encontrados` (JSON) y `saldo_total_acumulado`.
+    Los clientes lo leen con `RecordBatchStreamReader.read_next_batch_with_custom_metadata()`.
+    Si falla un lote, el stream se cierra con un último record batch vacío cuyo `custom_metadata`
+    lleva la clave `error` (igual que la última línea `{"error": ...}` de `generar_ndjson`).
+
+    Args:
+        eventos (iterable): Tuplas `(tipo, valor)` producidas por la capa de lógica.
+
+    Yields:
+        bytes: Fragmentos del stream Arrow IPC.
+    """
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+
+    def _vaciar_sink() -> bytes:
+        datos = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return datos
+
+    try:
+        for tipo, valor in eventos:
+            if tipo == "esquema":
+                schema = valor.to_arrow().schema
+                writer = pa.ipc.new_stream(sink, schema)
+            elif tipo == "encontrados":
+                for batch in valor.to_arrow().cast(schema).to_batches():
+                    writer.write_batch(batch)
+            elif tipo == "resumen":
+                metadata = {
+                    "no_encontrados": json.dumps(valor["no_encontrados"]),
+                    "saldo_total_acumulado": str(valor["saldo_total_acumulado"]),
+                }
+                writer.write_batch(pa.RecordBatch.from_pylist([], schema=schema), custom_metadata=metadata)
+                writer.close()
+
+            datos = _vaciar_sink()
+            if datos:
+                yield datos
+    except Exception as e:
+        # Las cabeceras ya se enviaron, así que el error viaja en el metadata de un último batch.
+        print(f"Error durante el streaming Arrow IPC: {e}")
+        if writer is None:
+            schema = pa.schema([])
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(pa.RecordBatch.from_pylist([], schema=schema), custom_metadata={"error": str(e)})
+        writer.close()
+        yield _vaciar_sink()
+
+
+def serializar_dataframe(df, mimetype: str, metadatos: dict = None) -> bytes:
+    """
+    Serializa un DataFrame de Polars completo a Arrow IPC (stream) o Parquet.
+
+    La conversión Polars -> Arrow comparte los buffers columnares, así que no hay ningún
+    recorrido fila a fila en Python. Los `metadatos` (ej. datos de paginación) se guardan
+    en el esquema para que el archivo sea autocontenido.
+
+    Args:
+        df (pl.DataFrame): Los datos a serializar.
+        mimetype (str): `MIMETYPE_ARROW_STREAM` o `MIMETYPE_PARQUET`.
+        metadatos (dict, optional): Pares clave/valor a guardar en el esquema (se convierten a texto).
+
+    Returns:
+        bytes: El contenido binario listo para enviar.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tabla = df.to_arrow()
+    if metadatos:
+        tabla = tabla.replace_schema_metadata({clave: str(valor) for clave, valor in metadatos.items()})
+
+    sink = io.BytesIO()
+    if mimetype == MIMETYPE_PARQUET:
+        pq.write_table(tabla, sink)
+    elif mimetype == MIMETYPE_ARROW_STREAM:
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+    else:
+        raise ValueError(f"Formato binario no soportado: {mimetype}")
+
+    return sink.getvalue()
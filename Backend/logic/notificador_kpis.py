@@ -0,0 +1,199 @@
+# logic/notificador_kpis.py
+"""
+Notificación de KPIs por Server-Sent Events (SSE).
+
+En lugar de que cada usuario recargue el dashboard para ver datos nuevos, el navegador se
+suscribe con su rango de fechas y el servidor le envía los KPIs actuales al conectarse y después
+cada vez que cambian. Un único hilo por proceso revisa periódicamente la versión del snapshot;
+cuando cambia (los datos se recargaron desde la BD), calcula los KPIs UNA vez por cada rango
+suscrito distinto y los envía solo a los suscriptores de los rangos cuyos KPIs cambiaron de verdad.
+Antes de cada revisión, `revalidar` evita recargar el snapshot si la BD no cambió.
+
+Cada worker de gunicorn tiene su propio notificador, con sus suscriptores y su snapshot.
+"""
+# --- Importaciones ---
+import json
+import queue
+import threading
+import time
+import traceback
+
+
+class Suscripcion:
+    """Un navegador conectado. Solo guarda el ÚLTIMO mensaje pendiente: los anteriores ya no importan."""
+
+    def __init__(self, rango: tuple):
+        self.rango = rango
+        self._mensajes = queue.Queue(maxsize=1)
+
+    def publicar(self, mensaje: str):
+        try:
+            self._mensajes.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._mensajes.put_nowait(mensaje)
+        except queue.Full:
+            pass  # Otro hilo publicó a la vez; su mensaje es igual de reciente.
+
+    def esperar(self, timeout: float):
+        """Devuelve el siguiente mensaje, o None si no llegó ninguno en `timeout` segundos."""
+        try:
+            return self._mensajes.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class NotificadorKpis:
+    """
+    Args:
+        obtener_kpis (callable): Recibe (fecha_inicio, fecha_fin, granularidad) y devuelve
+            (version_datos, kpis). Debe ser barato si la versión no cambió (memoizado).
+        intervalo_s (float): Cada cuántos segundos se revisa si hay una versión nueva.
+        max_conexiones (int): Suscripciones simultáneas permitidas en este proceso (cada una
+            ocupa un hilo del servidor mientras está abierta).
+        revalidar (callable, opcional): Se llama una vez por revisión, antes de pedir los KPIs, con
+            los segundos que faltan como mucho para la revisión siguiente (ver `revalidar_snapshot`).
+    """
+
+    def __init__(self, obtener_kpis, intervalo_s: float, max_conexiones: int, revalidar=None):
+        self._obtener_kpis = obtener_kpis
+        self._revalidar = revalidar
+        self.intervalo_s = intervalo_s
+        self.max_conexiones = max_conexiones
+        self._candado = threading.Lock()
+        self._suscripciones = {}  # rango -> set de Suscripcion
+        self._estado_rangos = {}  # rango -> {"version": str, "kpis_json": str, "mensaje": str}
+        self._hilo = None
+        self._estadisticas = {"calculos": 0, "envios": 0, "sin_cambios": 0, "rechazadas": 0}
+
+    # --------------------------------------------------------------------------
+    # Suscripciones
+    # --------------------------------------------------------------------------
+
+    def suscribir(self, fecha_inicio: str, fecha_fin: str, granularidad: str = None):
+        """
+        Registra un navegador y le deja preparado un primer evento con los KPIs actuales del rango:
+        así no se pierde un cambio ocurrido entre su última consulta y la primera revisión.
+        Devuelve None si se alcanzó `max_conexiones`.
+        """
+        rango = (fecha_inicio, fecha_fin, granularidad)
+        with self._candado:
+            if sum(len(s) for s in self._suscripciones.values()) >= self.max_conexiones:
+                self._estadisticas["rechazadas"] += 1
+                return None
+            suscripcion = Suscripcion(rango)
+            self._suscripciones.setdefault(rango, set()).add(suscripcion)
+            self._iniciar_hilo()
+
+        try:
+            version, kpis = self._obtener_kpis(*rango)
+            kpis_json = self._serializar(kpis)
+            with self._candado:
+                # Si el hilo ya conoce el rango, su estado es igual o más reciente que el calculado aquí.
+                estado = self._estado_rangos.get(rango)
+                if estado is None and rango in self._suscripciones:
+                    estado = self._nuevo_estado(rango, version, kpis, kpis_json)
+            if estado is not None:
+                suscripcion.publicar(estado["mensaje"])
+        except Exception:
+            # Sin evento inicial: la primera revisión del hilo, al no conocer el rango, lo enviará.
+            traceback.print_exc()
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion):
+        with self._candado:
+            suscriptores = self._suscripciones.get(suscripcion.rango)
+            if suscriptores is None:
+                return
+            suscriptores.discard(suscripcion)
+            if not suscriptores:
+                # Nadie mira ya este rango: se olvida su estado para no recalcularlo.
+                del self._suscripciones[suscripcion.rango]
+                self._estado_rangos.pop(suscripcion.rango, None)
+
+    def _iniciar_hilo(self):
+        # Se arranca con la primera suscripción (y no al importar) para que exista en cada worker.
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._bucle, name="notificador-kpis", daemon=True)
+            self._hilo.start()
+
+    # --------------------------------------------------------------------------
+    # Revisión periódica
+    # --------------------------------------------------------------------------
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.intervalo_s)
+            with self._candado:
+                rangos = list(self._suscripciones)
+            if rangos and self._revalidar:
+                try:
+                    # Margen de dos intervalos por si la revisión se retrasa.
+                    self._revalidar(2 * self.intervalo_s)
+                except Exception:
+                    traceback.print_exc()
+            for rango in rangos:
+                try:
+                    self._revisar_rango(rango)
+                except Exception:
+                    # Un rango con error (ej. BD caída) no debe detener las notificaciones de los demás.
+                    traceback.print_exc()
+
+    def _revisar_rango(self, rango: tuple):
+        version, kpis = self._obtener_kpis(*rango)
+
+        with self._candado:
+            estado = self._estado_rangos.get(rango)
+            if rango not in self._suscripciones or (estado and estado["version"] == version):
+                return
+
+        kpis_json = self._serializar(kpis)
+
+        with self._candado:
+            if rango not in self._suscripciones:
+                return
+            # Sin estado previo (falló el cálculo inicial al suscribirse) también se envía: el
+            # navegador no recibió todavía ningún evento de este rango.
+            if estado is not None and estado["kpis_json"] == kpis_json:
+                estado["version"] = version
+                self._estadisticas["sin_cambios"] += 1
+                return
+            mensaje = self._nuevo_estado(rango, version, kpis, kpis_json)["mensaje"]
+            suscriptores = list(self._suscripciones[rango])
+
+        for suscripcion in suscriptores:
+            suscripcion.publicar(mensaje)
+        self._estadisticas["envios"] += len(suscriptores)
+        print(f"KPIs del rango {rango[0]} a {rango[1]} cambiaron (versión {version}): enviados a {len(suscriptores)} suscriptor(es)")
+
+    def _serializar(self, kpis: dict) -> str:
+        self._estadisticas["calculos"] += 1
+        return json.dumps(kpis, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _nuevo_estado(self, rango: tuple, version: str, kpis: dict, kpis_json: str) -> dict:
+        """Guarda (con el candado tomado) los KPIs vigentes del rango y el evento que los envía."""
+        mensaje = formatear_evento_sse(
+            "kpis", {**kpis, "timestamp_analisis": time.strftime("%Y-%m-%dT%H:%M:%S")}, id_evento=version
+        )
+        estado = {"version": version, "kpis_json": kpis_json, "mensaje": mensaje}
+        self._estado_rangos[rango] = estado
+        return estado
+
+    def estadisticas(self) -> dict:
+        with self._candado:
+            return {
+                **self._estadisticas,
+                "conexiones": sum(len(s) for s in self._suscripciones.values()),
+                "rangos": len(self._suscripciones),
+                "max_conexiones": self.max_conexiones,
+            }
+
+
+def formatear_evento_sse(evento: str, datos, id_evento: str = None) -> str:
+    """Serializa un evento en el formato de texto de Server-Sent Events."""
+    lineas = [f"event: {evento}"]
+    if id_evento:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"data: {json.dumps(datos, ensure_ascii=False, default=str)}")
+    return "\n".join(lineas) + "\n\n"
@@ -0,0 +1,228 @@
+# logic/trabajos_exportacion.py
+"""
+Exportaciones a Excel en segundo plano.
+
+En lugar de mantener abierta la conexión HTTP mientras se genera un Excel grande, el cliente
+envía el trabajo, recibe un id, consulta su progreso (hoja por hoja) y descarga el archivo
+cuando está listo.
+
+El estado de cada trabajo y el archivo generado se guardan en disco (un `.json` y un `.xlsx`
+por trabajo), así que cualquier worker de gunicorn puede responder a las consultas de estado
+y a la descarga, no solo el que ejecuta el trabajo. El id se deriva de los parámetros: dos
+envíos idénticos, desde el mismo worker o desde otro, comparten el mismo trabajo.
+"""
+# --- Importaciones ---
+import hashlib
+import json
+import os
+import re
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Estados posibles de un trabajo.
+ESTADO_EN_COLA = "en_cola"
+ESTADO_PROCESANDO = "procesando"
+ESTADO_COMPLETADO = "completado"
+ESTADO_SIN_DATOS = "sin_datos"
+ESTADO_ERROR = "error"
+ESTADOS_EN_CURSO = (ESTADO_EN_COLA, ESTADO_PROCESANDO)
+
+# Estados de una hoja que cuentan como terminada para el progreso.
+ESTADOS_HOJA_TERMINADA = ("completada", "omitida")
+
+_PATRON_ID_TRABAJO = re.compile(r"^[0-9a-f]{24}$")
+
+
+class ExportacionSinDatos(Exception):
+    """La exportación terminó correctamente pero no había datos que escribir."""
+
+
+class GestorExportaciones:
+    """
+    Envía trabajos de exportación a un pool propio y guarda su estado en `directorio`.
+
+    Args:
+        directorio (str): Carpeta donde se guardan estados y archivos (compartida por los workers).
+        hilos (int): Trabajos que se generan a la vez en este proceso.
+        retencion_s (int): Segundos que se conserva un trabajo terminado (y su archivo).
+        tiempo_max_s (int): Un trabajo en curso que no avanza en este tiempo se da por perdido
+            (ej. el worker que lo ejecutaba se reinició) y puede volver a enviarse.
+    """
+
+    def __init__(self, directorio: str, hilos: int, retencion_s: int, tiempo_max_s: int):
+        self.directorio = directorio
+        self.retencion_s = retencion_s
+        self.tiempo_max_s = tiempo_max_s
+        os.makedirs(directorio, exist_ok=True)
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="exportaciones")
+
+    # --------------------------------------------------------------------------
+    # Persistencia del estado
+    # --------------------------------------------------------------------------
+
+    def _ruta_estado(self, trabajo_id: str) -> str:
+        return os.path.join(self.directorio, f"{trabajo_id}.json")
+
+    def _ruta_archivo(self, trabajo_id: str) -> str:
+        return os.path.join(self.directorio, f"{trabajo_id}.xlsx")
+
+    def _ruta_temporal(self, trabajo_id: str) -> str:
+        return os.path.join(self.directorio, f"{trabajo_id}.{uuid.uuid4().hex}.tmp")
+
+    def _leer_estado(self, trabajo_id: str):
+        try:
+            with open(self._ruta_estado(trabajo_id), encoding="utf-8") as archivo:
+                return json.load(archivo)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _guardar_estado(self, estado: dict):
+        """Escribe el estado de forma atómica: quien lo lea nunca ve un JSON a medias."""
+        estado["actualizado"] = time.time()
+        ruta_temporal = self._ruta_temporal(estado["id"])
+        with open(ruta_temporal, "w", encoding="utf-8") as archivo:
+            json.dump(estado, archivo, ensure_ascii=False)
+        os.replace(ruta_temporal, self._ruta_estado(estado["id"]))
+
+    def _crear_estado(self, estado: dict) -> bool:
+        """Crea el estado solo si no existe. Devuelve False si otro hilo o worker se adelantó."""
+        estado["actualizado"] = time.time()
+        ruta_temporal = self._ruta_temporal(estado["id"])
+        with open(ruta_temporal, "w", encoding="utf-8") as archivo:
+            json.dump(estado, archivo, ensure_ascii=False)
+        try:
+            # `link` falla si el destino ya existe, lo que lo convierte en un "crear si no existe" atómico.
+            os.link(ruta_temporal, self._ruta_estado(estado["id"]))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(ruta_temporal)
+
+    def _eliminar(self, trabajo_id: str):
+        for ruta in (self._ruta_estado(trabajo_id), self._ruta_archivo(trabajo_id)):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+    def _vencido(self, estado: dict) -> bool:
+        antiguedad = time.time() - estado["actualizado"]
+        if estado["estado"] in ESTADOS_EN_CURSO:
+            return antiguedad > self.tiempo_max_s
+        return antiguedad > self.retencion_s
+
+    def _limpiar_vencidos(self):
+        for nombre in os.listdir(self.directorio):
+            trabajo_id, extension = os.path.splitext(nombre)
+            if extension != ".json":
+                continue
+            estado = self._leer_estado(trabajo_id)
+            if estado and self._vencido(estado):
+                self._eliminar(trabajo_id)
+
+    # --------------------------------------------------------------------------
+    # API pública
+    # --------------------------------------------------------------------------
+
+    def enviar(self, tipo: str, parametros: dict, hojas: list, generar, descripcion: str = "") -> dict:
+        """
+        Envía un trabajo, o devuelve el existente si ya hay uno idéntico en curso o terminado.
+
+        Args:
+            tipo (str): Tipo de exportación (forma parte de la clave de deduplicación).
+            parametros (dict): Parámetros del trabajo (deben ser serializables a JSON).
+            hojas (list): Nombres de las hojas que se irán completando, para mostrar el progreso.
+            generar (callable): Recibe `notificar_progreso(hoja, estado)` y devuelve
+                `(contenido_bytes, nombre_archivo)`. Lanza `ExportacionSinDatos` si no hay datos.
+            descripcion (str): Texto corto para el estado y los logs (los parámetros no se guardan,
+                porque una lista de IDs puede ser muy larga).
+
+        Returns:
+            dict: El estado del trabajo.
+        """
+        self._limpiar_vencidos()
+
+        clave = json.dumps([tipo, parametros], sort_keys=True, ensure_ascii=False)
+        trabajo_id = hashlib.sha256(clave.encode("utf-8")).hexdigest()[:24]
+
+        existente = self._leer_estado(trabajo_id)
+        if existente and existente["estado"] != ESTADO_ERROR and not self._vencido(existente):
+            print(f"Exportación {trabajo_id} ya enviada ({existente['estado']}); se reutiliza.")
+            return self._con_progreso(existente)
+        if existente:
+            self._eliminar(trabajo_id)
+
+        estado = {
+            "id": trabajo_id,
+            "tipo": tipo,
+            "descripcion": descripcion,
+            "estado": ESTADO_EN_COLA,
+            "hojas": [{"nombre": hoja, "estado": "pendiente"} for hoja in hojas],
+            "creado": time.time(),
+            "nombre_archivo": None,
+            "mensaje": None,
+        }
+        if not self._crear_estado(estado):
+            return self._con_progreso(self._leer_estado(trabajo_id) or estado)
+
+        print(f"Exportación {trabajo_id} enviada: {tipo} {descripcion}")
+        self._ejecutor.submit(self._ejecutar, estado, generar)
+        return self._con_progreso(estado)
+
+    def _ejecutar(self, estado: dict, generar):
+        inicio = time.perf_counter()
+        estado["estado"] = ESTADO_PROCESANDO
+        self._guardar_estado(estado)
+
+        def notificar_progreso(hoja: str, estado_hoja: str):
+            for item in estado["hojas"]:
+                if item["nombre"] == hoja:
+                    item["estado"] = estado_hoja
+                    break
+            else:
+                estado["hojas"].append({"nombre": hoja, "estado": estado_hoja})
+            self._guardar_estado(estado)
+
+        try:
+            contenido, nombre_archivo = generar(notificar_progreso)
+            ruta_temporal = self._ruta_temporal(estado["id"])
+            with open(ruta_temporal, "wb") as archivo:
+                archivo.write(contenido)
+            os.replace(ruta_temporal, self._ruta_archivo(estado["id"]))
+            estado.update(estado=ESTADO_COMPLETADO, nombre_archivo=nombre_archivo, tamano_bytes=len(contenido))
+        except ExportacionSinDatos as e:
+            estado.update(estado=ESTADO_SIN_DATOS, mensaje=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            estado.update(estado=ESTADO_ERROR, mensaje=str(e))
+
+        estado["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        self._guardar_estado(estado)
+        print(f"Exportación {estado['id']} terminada ({estado['estado']}) en {estado['duracion_ms']:.2f} ms")
+
+    @staticmethod
+    def _con_progreso(estado: dict) -> dict:
+        """Añade el progreso (0 a 1) según las hojas terminadas."""
+        total = len(estado["hojas"])
+        terminadas = sum(1 for hoja in estado["hojas"] if hoja["estado"] in ESTADOS_HOJA_TERMINADA)
+        progreso = 1.0 if estado["estado"] == ESTADO_COMPLETADO else (terminadas / total if total else 0.0)
+        return {**estado, "progreso": round(progreso, 4)}
+
+    def obtener(self, trabajo_id: str):
+        """Devuelve el estado de un trabajo, o None si el id no es válido, no existe o venció."""
+        if not _PATRON_ID_TRABAJO.match(trabajo_id or ""):
+            return None
+        estado = self._leer_estado(trabajo_id)
+        if estado is None or self._vencido(estado):
+            return None
+        return self._con_progreso(estado)
+
+    def ruta_archivo(self, trabajo_id: str):
+        """Ruta del archivo generado si el trabajo está completado; None en otro caso."""
+        estado = self.obtener(trabajo_id)
+        if not estado or estado["estado"] != ESTADO_COMPLETADO:
+            return None
+        return self._ruta_archivo(trabajo_id)
@@ -4,7 +4,7 @@
    Este script gestiona la interactividad del dashboard principal.
    ========================================================================== */
 
-import { fetchApi } from './api.js';
+import { fetchApi, API_BASE_URL } from './api.js';
 import { showNotification, formatarMoneda } from './utils.js';
 let fullEntidadData = [];
 let fullSaldoData = [];
@@ -37,6 +37,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const statValorNoRadicado = document.getElementById('stat-valor-no-radicado');
     const estatusTableContainer = document.getElementById('estatus-table-container');
     const ingresosChartTitle = document.getElementById('ingresos-chart-title');
+    const ingresosGranularidadSelect = document.getElementById('ingresos-granularidad');
     const ejecutarBusquedaBtn = document.getElementById('ejecutar-busqueda-btn');
     const busquedaTextarea = document.getElementById('busqueda-textarea');
 
@@ -362,6 +363,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 estatusTableContainer.innerHTML = `<div class="table-wrapper"><p>No hay ítems pendientes por radicar en este período.</p></div>`;
             }
 
+            this.updateIngresos(data);
+        },
+
+        /** Actualiza solo el gráfico de ingresos (lo usa también el selector de granularidad). */
+        updateIngresos(data) {
             const ingresosData = data.ingresos_por_periodo || [];
             if (ingresosData.length > 0) {
                 const seriesData = ingresosData.map(item => [new Date(item.fecha_agrupada).getTime(), item.conteo]);
@@ -422,6 +428,44 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Actualización automática de KPIs (Server-Sent Events) ---
+    // En lugar de recargar la página para ver datos nuevos, el navegador se suscribe con su rango
+    // y el servidor le envía los KPIs solo cuando cambian tras una recarga de datos.
+
+    /** Espera antes de volver a suscribirse si el servidor rechazó la suscripción (ms). */
+    const REINTENTO_SUSCRIPCION_KPIS_MS = 30000;
+    let suscripcionKpis = null;
+    let reintentoSuscripcionKpis = null;
+
+    function cancelarSuscripcionKpis() {
+        clearTimeout(reintentoSuscripcionKpis);
+        if (suscripcionKpis) {
+            suscripcionKpis.close();
+            suscripcionKpis = null;
+        }
+    }
+
+    function suscribirseAKpis(params) {
+        cancelarSuscripcionKpis();
+        const fuente = new EventSource(`${API_BASE_URL}/reportes/kpis/suscripcion?${params.toString()}`);
+        suscripcionKpis = fuente;
+
+        fuente.addEventListener('kpis', (evento) => {
+            const datos = JSON.parse(evento.data);
+            if (datos.error) return;
+            charts.update(datos);
+            showNotification('Los datos se actualizaron automáticamente.', 'info');
+        });
+
+        fuente.addEventListener('error', () => {
+            // Tras un corte, EventSource se reconecta solo. Si el servidor rechazó la suscripción
+            // (ej. 503 por exceso de conexiones) queda cerrada, y se reintenta más tarde.
+            if (fuente === suscripcionKpis && fuente.readyState === EventSource.CLOSED) {
+                reintentoSuscripcionKpis = setTimeout(() => suscribirseAKpis(params), REINTENTO_SUSCRIPCION_KPIS_MS);
+            }
+        });
+    }
+
     runBtn.addEventListener('click', async () => {
         const fechaInicio = fechaInicioInput.value;
         const fechaFin = fechaFinInput.value;
@@ -448,6 +492,9 @@ document.addEventListener('DOMContentLoaded', () => {
             fecha_inicio: fechaInicioInput.value,
             fecha_fin: fechaFinInput.value
         });
+        if (ingresosGranularidadSelect.value) {
+            params.append('granularidad', ingresosGranularidadSelect.value);
+        }
         
         try {
             const result = await fetchApi(`/reportes/analizar-y-comprobar?${params.toString()}`);
@@ -456,6 +503,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(result.message);
             }
             if (result.data.error) {
+                cancelarSuscripcionKpis();
                 showNotification(result.data.error, 'info');
                 skeletonLoader.style.display = 'none'; // Oculta el esqueleto si no hay datos
                 return;
@@ -464,6 +512,7 @@ document.addEventListener('DOMContentLoaded', () => {
             charts.update(result.data);
             charts.show();
             downloadBtn.disabled = false;
+            suscribirseAKpis(params);
 
         } catch (e) {
             showNotification(e.message, 'error');
@@ -478,18 +527,68 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    downloadBtn.addEventListener('click', async () => {
-        downloadBtn.disabled = true;
-        downloadBtn.textContent = 'Generando...';
+    // El cambio de granularidad solo pide la serie de ingresos, sin repetir el análisis completo.
+    ingresosGranularidadSelect.addEventListener('change', async () => {
+        if (!fechaInicioInput.value || !fechaFinInput.value) return;
 
         const params = new URLSearchParams({
             fecha_inicio: fechaInicioInput.value,
             fecha_fin: fechaFinInput.value
         });
+        if (ingresosGranularidadSelect.value) {
+            params.append('granularidad', ingresosGranularidadSelect.value);
+        }
 
         try {
+            const result = await fetchApi(`/reportes/ingresos?${params.toString()}`);
+            if (!result.success) {
+                throw new Error(result.message);
+            }
+            charts.updateIngresos(result.data);
+            // Las notificaciones de KPIs incluyen la serie de ingresos: se pide con la nueva granularidad.
+            if (suscripcionKpis) suscribirseAKpis(params);
+        } catch (e) {
+            showNotification(`No se pudo actualizar el gráfico de ingresos: ${e.message}`, 'error');
+        }
+    });
+
+    /** Espera entre consultas del progreso de una exportación (ms). */
+    const INTERVALO_PROGRESO_EXPORTACION_MS = 1000;
+
+    downloadBtn.addEventListener('click', async () => {
+        downloadBtn.disabled = true;
+        downloadBtn.textContent = 'Generando...';
+
+        try {
+            // 1. Se envía la exportación: el servidor la genera en segundo plano y responde al instante.
+            const envio = await fetchApi('/reportes/exportaciones', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    tipo: 'rango',
+                    fecha_inicio: fechaInicioInput.value,
+                    fecha_fin: fechaFinInput.value
+                })
+            });
+            let trabajo = envio.data;
+
+            // 2. Se consulta el progreso hasta que termine, mostrando cuántas hojas van listas.
+            while (trabajo.estado === 'en_cola' || trabajo.estado === 'procesando') {
+                const hojasListas = trabajo.hojas.filter(h => h.estado === 'completada' || h.estado === 'omitida').length;
+                downloadBtn.textContent = trabajo.estado === 'en_cola'
+                    ? 'En cola...'
+                    : `Generando... (${hojasListas}/${trabajo.hojas.length} hojas)`;
+                await new Promise(resolve => setTimeout(resolve, INTERVALO_PROGRESO_EXPORTACION_MS));
+                trabajo = (await fetchApi(`/reportes/exportaciones/${trabajo.id}`)).data;
+            }
+
+            if (trabajo.estado !== 'completado') {
+                throw new Error(trabajo.mensaje || 'La exportación no pudo completarse.');
+            }
+
+            // 3. Se descarga el archivo terminado.
             // Nota: fetchApi no funciona aquí porque necesitamos el blob, no el JSON
-            const response = await fetch(`http://192.168.1.10:5000/api/reportes/descargar-excel?${params.toString()}`);
+            const response = await fetch(`${API_BASE_URL}/reportes/exportaciones/${trabajo.id}/descargar`);
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({}));
                 throw new Error(errorData.message || `Error del servidor: HTTP ${response.status}`);
@@ -500,7 +599,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const a = document.createElement('a');
             a.style.display = 'none';
             a.href = url;
-            a.download = `Reporte_Glosas_${fechaInicioInput.value}_a_${fechaFinInput.value}.xlsx`;
+            a.download = trabajo.nombre_archivo || `Reporte_Glosas_${fechaInicioInput.value}_a_${fechaFinInput.value}.xlsx`;
             
             document.body.appendChild(a);
             a.click();
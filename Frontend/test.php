@@ -151,10 +151,18 @@
             <div class="col-lg-6">
                 <div class="card h-100">
                     <div class="card-body d-flex flex-column">
-                        <h2 id="ingresos-chart-title" class="card-title">
-                            Ingreso de glosas
-                            <i class="fas fa-question-circle ms-2" data-bs-toggle="tooltip" data-bs-placement="top" title="Cantidad de glosas ingresadas por período de notificación."></i>
-                        </h2>
+                        <div class="d-flex justify-content-between align-items-start">
+                            <h2 id="ingresos-chart-title" class="card-title">
+                                Ingreso de glosas
+                                <i class="fas fa-question-circle ms-2" data-bs-toggle="tooltip" data-bs-placement="top" title="Cantidad de glosas ingresadas por período de notificación."></i>
+                            </h2>
+                            <select id="ingresos-granularidad" class="form-select form-select-sm w-auto" aria-label="Granularidad del gráfico de ingresos">
+                                <option value="" selected>Automática</option>
+                                <option value="diario">Diario</option>
+                                <option value="mensual">Mensual</option>
+                                <option value="anual">Anual</option>
+                            </select>
+                        </div>
                         <div id="chart-ingresos" class="flex-grow-1"></div>
                     </div>
                 </div>